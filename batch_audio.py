@@ -0,0 +1,128 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from musthe import Scale
+from fretboard import ROOT_NOTES
+from fretboard_cli import harmony_of
+from batch_diagrams import all_types, chunked, report
+from midi_file import write_midi, arpeggio_events, chord_events
+from play_sounds import render_events, save_wav, SAMPLERATE, FRAME_BYTES
+
+FORMATS = ('wav', 'mid')
+
+# Scales are played as arpeggios, as in the app, and chords both ways.
+STYLES = {
+    'scale':    ('arpeggio',),
+    'chord':    ('chord', 'arpeggio'),
+}
+
+def make_jobs(roots, types, notes=None):
+    """(root, type, style) for every combination, and (None, 'note', midi note) for each of notes."""
+    jobs = []
+    for root in roots:
+        for type in types:
+            for style in STYLES['scale' if type in Scale.scales else 'chord']:
+                jobs.append((root, type, style))
+    for note in notes or []:
+        jobs.append((None, 'note', note))
+    return jobs
+
+def job_events(job):
+    """A name for the job and the events that play it, as the app plays them."""
+    root, type, style = job
+    if type == 'note':
+        return str(style), chord_events([style])
+    midi = harmony_of(root, type).midi
+    return f"{root}_{type}_{style}", chord_events(midi) if style == 'chord' else arpeggio_events(midi)
+
+def render(job, output, samplerate=SAMPLERATE, format='wav'):
+    """Render one job to output/<root>_<type>_<style>.<format>, or output/notes/<midi note>.<format>.
+    Returns (file name, bytes of samples rendered)."""
+    name, events = job_events(job)
+    filename = os.path.join(output, 'notes' if job[1] == 'note' else '', f"{name}.{format}")
+    if format == 'mid':
+        write_midi(filename, [(name.replace('_', ' '), events)], type=0)
+        return filename, 0
+    samples = render_events(events, samplerate)
+    save_wav(filename, samples, samplerate)
+    return filename, len(samples)
+
+def write_keys(roots, types, output):
+    """One type 1 MIDI file per root, output/<root>.mid, with a track for each type and style. Returns the file names."""
+    filenames = []
+    for root in roots:
+        jobs = make_jobs([root], types)
+        filename = os.path.join(output, f"{root}.mid")
+        write_midi(filename, ( (name.replace('_', ' '), events) for name, events in map(job_events, jobs) ), type=1)
+        filenames.append(filename)
+    return filenames
+
+def render_chunk(jobs, output, samplerate=SAMPLERATE, format='wav'):
+    """Render a chunk of jobs in one go. Returns (how many, stereo samples rendered)."""
+    frames = 0
+    for job in jobs:
+        filename, size = render(job, output, samplerate, format)
+        frames = frames + size // FRAME_BYTES
+    return len(jobs), frames
+
+def run(jobs, output, workers=None, chunksize=16, samplerate=SAMPLERATE, format='wav', progress=report):
+    """Render jobs to output, spread over a process pool in chunks, or in this process if workers is 1.
+    Returns (files written, stereo samples rendered)."""
+    os.makedirs(output, exist_ok=True)
+    if any(job[1] == 'note' for job in jobs):
+        os.makedirs(os.path.join(output, 'notes'), exist_ok=True)
+    total = len(jobs)
+    done = 0
+    frames = 0
+    start = time.perf_counter()
+    if workers == 1:
+        results = ( render_chunk(chunk, output, samplerate, format) for chunk in chunked(jobs, chunksize) )
+        for count, size in results:
+            done, frames = done + count, frames + size
+            if progress:
+                progress(done, total, start)
+        return done, frames
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [ pool.submit(render_chunk, chunk, output, samplerate, format) for chunk in chunked(jobs, chunksize) ]
+        for future in as_completed(futures):
+            count, size = future.result()
+            done, frames = done + count, frames + size
+            if progress:
+                progress(done, total, start)
+    return done, frames
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every root with every scale and chord type to WAV or MIDI files, without an audio device. Scales are played as arpeggios, chords both together and as arpeggios.")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='wav', help="Output format.")
+    parser.add_argument('-k', '--keys', action='store_true', help="With --format mid, write one MIDI file per root with a track for each scale and chord instead.")
+    parser.add_argument('-o', '--output', default='audio', metavar='DIR', help="Directory to write to.")
+    parser.add_argument('-r', '--roots', nargs='+', choices=ROOT_NOTES, default=ROOT_NOTES, help="Root notes.")
+    parser.add_argument('-t', '--types', nargs='+', choices=all_types(), default=all_types(), help="Scale and chord types.")
+    parser.add_argument('-n', '--notes', nargs=2, type=int, metavar=('LOW', 'HIGH'), help="Also render single notes, midi notes LOW to HIGH, to DIR/notes.")
+    parser.add_argument('-s', '--samplerate', type=int, default=SAMPLERATE, help="Sample rate in Hz.")
+    parser.add_argument('-w', '--workers', type=int, help="Worker processes, default one per CPU. 1 renders in this process.")
+    parser.add_argument('-c', '--chunksize', type=int, default=16, help="Files per task sent to a worker.")
+    parser.add_argument('-q', '--quiet', action='store_true', help="No progress report.")
+    args = parser.parse_args(argv)
+
+    if args.format == 'mid' and args.keys:
+        os.makedirs(args.output, exist_ok=True)
+        filenames = write_keys(args.roots, args.types, args.output)
+        print(f"Wrote {len(filenames)} MIDI files to {args.output}.")
+        return
+
+    notes = range(args.notes[0], args.notes[1] + 1) if args.notes else None
+    jobs = make_jobs(args.roots, args.types, notes)
+    start = time.perf_counter()
+    done, frames = run(jobs, args.output, workers=args.workers, chunksize=args.chunksize, samplerate=args.samplerate,
+                       format=args.format, progress=None if args.quiet else report)
+    elapsed = time.perf_counter() - start
+    if args.format == 'mid':
+        print(f"Wrote {done} MIDI files to {args.output} in {elapsed:.2f} s.")
+        return
+    print(f"Wrote {done} files to {args.output} in {elapsed:.2f} s: {frames} samples, "
+          f"{frames / elapsed / 1e6:.1f} million samples per second, {frames / args.samplerate / elapsed:.0f} times real time.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from musthe import Scale, Chord
+from fretboard import ROOT_NOTES, PRESETS
+from fretboard_cli import diagram, instrument, as_json
+
+FORMATS = ('svg', 'png', 'json')
+
+# Same colors as INTERVAL_COLORS in fretboard_app.py, which can't be imported without Qt:
+# (background, text) for the root and each interval quality.
+DIAGRAM_COLORS = {
+    'P1':   ('#ff0000', '#ffffff'),
+    'M':    ('#90ee90', '#000000'),
+    'm':    ('#add8e6', '#000000'),
+    'P':    ('#ffff00', '#000000'),
+    'A':    ('#fea07a', '#000000'),
+    'd':    ('#d9aaae', '#000000'),
+}
+
+CELL_WIDTH = 44
+ROW_HEIGHT = 36
+LEFT = 44
+TOP = 44
+BOTTOM = 40
+
+def all_types():
+    """Every scale type and chord type, without the chord aliases."""
+    return list(Scale.scales) + [ c for c in Chord.valid_types if c not in Chord.aliases ]
+
+def make_jobs(presets, roots, types):
+    """(preset, root, type) for every combination."""
+    return [ (preset, root, type) for preset in presets for root in roots for type in types ]
+
+def translate(string):
+    """Sharp and flat signs for # and b."""
+    return string.replace('b', '♭').replace('#', '♯')
+
+def layout(f, markers):
+    """The drawing of a built Fretboard, as (width, height, shapes). Shapes are ('line', x1, y1, x2, y2, width),
+    ('circle', x, y, radius, fill) and ('text', x, y, text, color, size), so SVG and PNG look the same."""
+    frets = list(range(f.frets[0], f.frets[1]+1))
+    rows = len(f.notes_grid)
+    width = LEFT + CELL_WIDTH * len(frets) + 10
+    height = TOP + ROW_HEIGHT * rows + BOTTOM
+    shapes = []
+
+    title = f"{f.harmony.root} {f.harmony.name.replace('_', ' ')} {f.harmony.kind}: {'  '.join(f.harmony.all_notes)}"
+    shapes.append(('text', width / 2, 24, translate(title), '#000000', 16))
+
+    # The frets, the nut thicker, and the strings, named on the left.
+    for column, fret in enumerate(frets):
+        x = LEFT + CELL_WIDTH * (column + 1)
+        shapes.append(('line', x, TOP, x, TOP + ROW_HEIGHT * rows, 2))
+        if fret == 0:
+            shapes.append(('line', x, TOP, x, TOP + ROW_HEIGHT * rows, 6))
+    for row, name in enumerate(f.tuning_with_octaves):
+        y = TOP + ROW_HEIGHT * row + ROW_HEIGHT / 2
+        shapes.append(('line', LEFT, y, LEFT + CELL_WIDTH * len(frets), y, 1))
+        shapes.append(('text', LEFT / 2, y + 5, translate(name), '#000000', 12))
+
+    for row, (notes, intervals) in enumerate(zip(f.notes_grid, f.intervals_grid)):
+        y = TOP + ROW_HEIGHT * row + ROW_HEIGHT / 2
+        for column, (note, interval) in enumerate(zip(notes, intervals)):
+            if note == '':
+                continue
+            x = LEFT + CELL_WIDTH * column + CELL_WIDTH / 2
+            background, color = DIAGRAM_COLORS.get(interval if interval == 'P1' else interval[0], DIAGRAM_COLORS['d'])
+            shapes.append(('circle', x, y, ROW_HEIGHT / 2 - 3, background))
+            shapes.append(('text', x, y + 5, translate(note), color, 13))
+
+    # Fret numbers and markers.
+    y = TOP + ROW_HEIGHT * rows + 18
+    for column, fret in enumerate(frets):
+        x = LEFT + CELL_WIDTH * column + CELL_WIDTH / 2
+        if fret > 0:
+            shapes.append(('text', x, y, str(fret), '#000000', 12))
+        if fret in markers['single']:
+            shapes.append(('text', x, y + 16, "●", '#000000', 10))
+        elif fret in markers['double']:
+            shapes.append(('text', x, y + 16, "●●", '#000000', 10))
+    return width, height, shapes
+
+def to_svg(width, height, shapes):
+    """SVG text for a layout()."""
+    lines = [ f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+              f'<rect width="{width}" height="{height}" fill="#ffffff"/>' ]
+    for shape in shapes:
+        if shape[0] == 'line':
+            kind, x1, y1, x2, y2, stroke = shape
+            lines.append(f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="#000000" stroke-width="{stroke}"/>')
+        elif shape[0] == 'circle':
+            kind, x, y, r, fill = shape
+            lines.append(f'<circle cx="{x}" cy="{y}" r="{r}" fill="{fill}" stroke="#000000" stroke-width="2"/>')
+        else:
+            kind, x, y, text, color, size = shape
+            text = text.replace('&', '&amp;').replace('<', '&lt;')
+            lines.append(f'<text x="{x}" y="{y}" fill="{color}" font-size="{size}" font-family="sans-serif" text-anchor="middle">{text}</text>')
+    lines.append('</svg>')
+    return "\n".join(lines) + "\n"
+
+def save_png(width, height, shapes, filename):
+    """Paint a layout() with QPainter on an offscreen image and save it as PNG. Needs init_worker('png') first."""
+    from PyQt5 import QtGui, QtCore
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32)
+    image.fill(QtGui.QColor('white'))
+    painter = QtGui.QPainter(image)
+    painter.setRenderHint(QtGui.QPainter.Antialiasing)
+    for shape in shapes:
+        if shape[0] == 'line':
+            kind, x1, y1, x2, y2, stroke = shape
+            painter.setPen(QtGui.QPen(QtGui.QColor('black'), stroke))
+            painter.drawLine(QtCore.QPointF(x1, y1), QtCore.QPointF(x2, y2))
+        elif shape[0] == 'circle':
+            kind, x, y, r, fill = shape
+            painter.setPen(QtGui.QPen(QtGui.QColor('black'), 2))
+            painter.setBrush(QtGui.QColor(fill))
+            painter.drawEllipse(QtCore.QPointF(x, y), r, r)
+        else:
+            kind, x, y, text, color, size = shape
+            font = QtGui.QFont('sans-serif')
+            font.setPixelSize(size)
+            painter.setFont(font)
+            painter.setPen(QtGui.QColor(color))
+            # Centered on x, with y the baseline, as in the SVG.
+            box = QtCore.QRectF(x - 200, y - size, 400, size * 1.3)
+            painter.drawText(box, QtCore.Qt.AlignHCenter | QtCore.Qt.AlignTop, text)
+    painter.end()
+    # A diagram has few colors: a palette image encodes in about half the time and a quarter of the size.
+    image = image.convertToFormat(QtGui.QImage.Format_Indexed8, QtCore.Qt.ThresholdDither | QtCore.Qt.AvoidDither)
+    image.save(filename, 'PNG')
+
+def init_worker(format):
+    """Set up a worker process. PNG needs a QGuiApplication for fonts, on the offscreen platform."""
+    if format == 'png':
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5 import QtGui
+        global qt_app
+        if QtGui.QGuiApplication.instance() is None:
+            qt_app = QtGui.QGuiApplication([])
+
+def render(job, format, output):
+    """Build one diagram and write it to output/<preset>/<root>_<type>.<format>. Returns the file name."""
+    preset, root, type = job
+    tuning, frets = instrument(preset)
+    f = diagram(root, type, tuning, frets)
+    directory = os.path.join(output, preset)
+    filename = os.path.join(directory, f"{root}_{type}.{format}")
+    if format == 'json':
+        with open(filename, 'w', encoding='utf-8') as out:
+            out.write(as_json(f))
+        return filename
+    width, height, shapes = layout(f, PRESETS[preset]['markers'])
+    if format == 'svg':
+        with open(filename, 'w', encoding='utf-8') as out:
+            out.write(to_svg(width, height, shapes))
+    else:
+        save_png(width, height, shapes, filename)
+    return filename
+
+def render_chunk(jobs, format, output):
+    """Render a chunk of jobs in one go, so each task sent to a worker is worth the trip. Returns how many."""
+    for job in jobs:
+        render(job, format, output)
+    return len(jobs)
+
+def chunked(jobs, size):
+    return [ jobs[i:i+size] for i in range(0, len(jobs), size) ]
+
+def report(done, total, start, stream=sys.stderr):
+    """One-line progress report, overwritten as it goes."""
+    elapsed = time.perf_counter() - start
+    stream.write(f"\rRendered {done}/{total} ({100 * done // max(total, 1)}%) in {elapsed:.1f} s")
+    if done == total:
+        stream.write("\n")
+    stream.flush()
+
+def run(jobs, format, output, workers=None, chunksize=32, progress=report):
+    """Render jobs to output, spread over a process pool in chunks, or in this process if workers is 1.
+    progress(done, total, start) is called as chunks finish. Returns the number of diagrams written."""
+    for preset in { job[0] for job in jobs }:
+        os.makedirs(os.path.join(output, preset), exist_ok=True)
+    total = len(jobs)
+    done = 0
+    start = time.perf_counter()
+    if workers == 1:
+        init_worker(format)
+        for chunk in chunked(jobs, chunksize):
+            done = done + render_chunk(chunk, format, output)
+            if progress:
+                progress(done, total, start)
+        return done
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(format,)) as pool:
+        futures = [ pool.submit(render_chunk, chunk, format, output) for chunk in chunked(jobs, chunksize) ]
+        for future in as_completed(futures):
+            done = done + future.result()
+            if progress:
+                progress(done, total, start)
+    return done
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render fretboard diagrams for every root and scale or chord type, for a set of instrument presets.")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='svg', help="Output format.")
+    parser.add_argument('-o', '--output', default='diagrams', metavar='DIR', help="Directory to write to, one subdirectory per preset.")
+    parser.add_argument('-p', '--presets', nargs='+', choices=list(PRESETS.keys()), default=list(PRESETS.keys()), help="Instrument presets.")
+    parser.add_argument('-r', '--roots', nargs='+', choices=ROOT_NOTES, default=ROOT_NOTES, help="Root notes.")
+    parser.add_argument('-t', '--types', nargs='+', choices=all_types(), default=all_types(), help="Scale and chord types.")
+    parser.add_argument('-w', '--workers', type=int, help="Worker processes, default one per CPU. 1 renders in this process.")
+    parser.add_argument('-c', '--chunksize', type=int, default=32, help="Diagrams per task sent to a worker.")
+    parser.add_argument('-q', '--quiet', action='store_true', help="No progress report.")
+    args = parser.parse_args(argv)
+
+    jobs = make_jobs(args.presets, args.roots, args.types)
+    start = time.perf_counter()
+    done = run(jobs, args.format, args.output, workers=args.workers, chunksize=args.chunksize,
+               progress=None if args.quiet else report)
+    print(f"Wrote {done} diagrams to {args.output} in {time.perf_counter() - start:.2f} s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Offline audio rendering benchmark: samples per second for notes, chords and arpeggios, with no audio device.
+Run from the repository root: python benchmarks/bench_audio.py [repeat]"""
+import os
+import sys
+import time
+
+__location__ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, __location__)
+
+from play_sounds import offline_synth, render_note, render_chord, render_arpeggio, FRAME_BYTES
+
+CASES = {
+    'note':             (render_note, 60),
+    'chord (triad)':    (render_chord, [60, 64, 67]),
+    'chord (6 notes)':  (render_chord, [40, 47, 52, 56, 59, 64]),
+    'arpeggio (scale)': (render_arpeggio, [60, 62, 64, 65, 67, 69, 71, 72]),
+}
+
+def bench(function, notes, samplerate, repeat):
+    """(stereo samples per second, times real time) for rendering notes repeat times."""
+    frames = 0
+    start = time.perf_counter()
+    for i in range(repeat):
+        frames = frames + len(function(notes, samplerate)) // FRAME_BYTES
+    elapsed = time.perf_counter() - start
+    return frames / elapsed, frames / samplerate / elapsed
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'benchmark':<30}{'Msamples/s':>12}{'x real time':>13}")
+    for samplerate in (22050, 44100, 48000):
+        offline_synth(samplerate)
+        for name, (function, notes) in CASES.items():
+            rate, speed = bench(function, notes, samplerate, repeat)
+            print(f"{name + ' @ ' + str(samplerate):<30}{rate / 1e6:>12.2f}{speed:>13.0f}")
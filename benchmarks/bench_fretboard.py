@@ -0,0 +1,154 @@
+"""Headless benchmarks for Fretboard.build, populate_fretboard and update().
+Runs with QT_QPA_PLATFORM=offscreen, so no display is needed.
+Run from the repository root:
+    python benchmarks/bench_fretboard.py --output results.json
+    python benchmarks/bench_fretboard.py --baseline results.json"""
+import os
+import sys
+import json
+import time
+import argparse
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+__location__ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, __location__)
+
+from musthe import Chord, Scale
+from fretboard import Fretboard, build_cache, harmony_table, ROOT_NOTES, PRESETS
+
+GUI_PRESETS = ['guitar', '7-string', 'banjo', 'ukulele']
+
+def percentiles(samples):
+    """Summary of samples (seconds) in milliseconds."""
+    ordered = sorted(samples)
+    def pick(p):
+        return ordered[min(len(ordered)-1, int(p/100 * len(ordered)))] * 1000
+    return {
+        'n':    len(ordered),
+        'min':  round(ordered[0]*1000, 4),
+        'p50':  round(pick(50), 4),
+        'p90':  round(pick(90), 4),
+        'p99':  round(pick(99), 4),
+        'max':  round(ordered[-1]*1000, 4),
+        'mean': round(sum(ordered)/len(ordered)*1000, 4),
+    }
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+def bench_build(repeat):
+    """Fretboard(tuning).build for every root with every scale and every chord type from the harmony table, per preset."""
+    results = {}
+    for name in GUI_PRESETS:
+        tuning = PRESETS[name]['tuning']
+        frets = PRESETS[name]['frets']
+        samples = []
+        for root in ROOT_NOTES:
+            for scale in Scale.scales:
+                harmony = harmony_table.scale(root, scale)
+                for i in range(repeat):
+                    samples.append(timed(lambda: Fretboard(tuning=list(tuning)).build(harmony=harmony, frets=frets)))
+            for chord in Chord.valid_types:
+                harmony = harmony_table.chord(root, chord)
+                for i in range(repeat):
+                    samples.append(timed(lambda: Fretboard(tuning=list(tuning)).build(harmony=harmony, frets=frets)))
+        results[f'build {name}'] = percentiles(samples)
+    return results
+
+def setup_gui(fretboard_app, preset, painted=False):
+    """Set up fretboard_app's globals the way its __main__ block does, for one preset."""
+    fretboard_app.fretWidths = fretboard_app.eighteen_rule()
+    fretboard_app.main_window = fretboard_app.MyMainWindow()
+    fretboard_app.help_dialog = fretboard_app.QtWidgets.QDialog()
+    fretboard_app.setup_help_dialog(fretboard_app.help_dialog)
+    ui = fretboard_app.new_ui()
+    fretboard_app.ui = ui
+    fretboard_app.tune_with_octave(fretboard_app.apply_preset(ui, PRESETS[preset]))
+    ui.tooltip = True
+    ui.painted = painted
+    ui.setupUi(fretboard_app.main_window, ui.tooltip, strings=ui.strings)
+    fretboard_app.initial_setup(ui)
+    fretboard_app.update()
+    return ui
+
+def bench_gui(repeat):
+    """populate_fretboard and update() per preset, and a sweep around the circle of fifths."""
+    import fretboard_app
+    app = fretboard_app.QtWidgets.QApplication.instance() or fretboard_app.QtWidgets.QApplication(sys.argv[:1])
+    results = {}
+    for name in GUI_PRESETS:
+        for painted in (False, True):
+            mode = 'painted' if painted else 'labels'
+            ui = setup_gui(fretboard_app, name, painted=painted)
+            populate = []
+            update = []
+            for i in range(repeat):
+                for root in ROOT_NOTES:
+                    ui.rootNoteSelector.setCurrentText(root)
+                    fretboard_app.change_scale_or_chord()
+                    ui.update_timer.stop()
+                    build_cache.clear()
+                    update.append(timed(fretboard_app.update))
+                    notes, intervals, midi = build_cache.build(ui.tuning_with_octave, harmony=ui.scale, frets=ui.frets)
+                    populate.append(timed(fretboard_app.populate_fretboard, ui, notes, intervals, midi, ui.frets))
+                    app.processEvents()
+            results[f'populate {name} {mode}'] = percentiles(populate)
+            results[f'update {name} {mode}'] = percentiles(update)
+
+            # Scroll around the circle of fifths, as with the dial.
+            sweep = []
+            for i in range(repeat):
+                for value in range(1, 13):
+                    def step():
+                        fretboard_app.select_root_from_label(value)
+                        ui.update_timer.stop()
+                        fretboard_app.update()
+                    sweep.append(timed(step))
+                    app.processEvents()
+            results[f'circle of fifths {name} {mode}'] = percentiles(sweep)
+            fretboard_app.main_window.hide()
+    return results
+
+def compare(results, baseline):
+    """Print p50 against the baseline. Returns the largest ratio (current / baseline)."""
+    worst = 0
+    print(f"{'benchmark':<40}{'p50 ms':>10}{'baseline':>10}{'ratio':>8}")
+    for name, stats in results.items():
+        if name not in baseline:
+            continue
+        ratio = stats['p50'] / baseline[name]['p50'] if baseline[name]['p50'] else 0
+        worst = max(worst, ratio)
+        print(f"{name:<40}{stats['p50']:>10.3f}{baseline[name]['p50']:>10.3f}{ratio:>8.2f}")
+    return worst
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the fretboard engine and GUI.")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions of each case.")
+    parser.add_argument('--output', metavar='FILE', help="Write the results as JSON.")
+    parser.add_argument('--baseline', metavar='FILE', help="Compare against results from an earlier run.")
+    parser.add_argument('--max-ratio', type=float, help="With --baseline, exit with an error if any p50 is more than this times the baseline.")
+    parser.add_argument('--no-gui', action='store_true', help="Only benchmark Fretboard.build.")
+    args = parser.parse_args()
+
+    results = bench_build(args.repeat)
+    if not args.no_gui:
+        results.update(bench_gui(args.repeat))
+
+    print(f"{'benchmark':<40}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, stats in results.items():
+        print(f"{name:<40}{stats['p50']:>9.3f}{stats['p90']:>9.3f}{stats['p99']:>9.3f}{stats['max']:>9.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        worst = compare(results, baseline)
+        if args.max_ratio and worst > args.max_ratio:
+            print(f"Slower than baseline: {worst:.2f} > {args.max_ratio}")
+            sys.exit(1)
@@ -0,0 +1,42 @@
+"""Startup benchmark: registering the Qt resources from the generated Python modules vs. the .rcc bundles.
+Each run is a fresh interpreter, so import and unmarshal costs are included.
+Run from the repository root: python benchmarks/bench_resources.py [runs]"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+__location__ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time, resource, sys
+sys.path.insert(0, {location!r})
+import PyQt5.QtCore
+start = time.perf_counter()
+from resources import register_resources
+register_resources('fretboard_rc', use_rcc={use_rcc})
+register_resources('play_sounds_resources', use_rcc={use_rcc})
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def measure(use_rcc, runs):
+    """Median seconds and max RSS (kB) to register both resource bundles."""
+    times = []
+    rss = []
+    for i in range(runs):
+        probe = PROBE.format(location=__location__, use_rcc=use_rcc)
+        out = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(out[0]))
+        rss.append(int(out[1]))
+    return statistics.median(times), statistics.median_low(rss)
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    results = {}
+    for name, use_rcc in (('module', False), ('rcc', True)):
+        seconds, maxrss = measure(use_rcc, runs)
+        results[name] = {'median_ms': round(seconds*1000, 2), 'maxrss_kb': maxrss}
+        print(f"{name:8} {seconds*1000:8.2f} ms {maxrss:8d} kB max RSS")
+    print(json.dumps(results))
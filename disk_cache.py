@@ -0,0 +1,97 @@
+import os
+import marshal
+import hashlib
+import musthe
+
+CACHEFILENAME = "fretboard_cache.bin"
+
+# Bump when the layout of anything stored in the cache changes.
+CACHE_VERSION = 2
+
+def musthe_version():
+    """The installed musthe version, from its dist-info directory name (importlib.metadata is slow to import),
+    and the modification time of musthe, so that a changed but unversioned musthe counts too."""
+    site_packages = os.path.dirname(os.path.dirname(musthe.__file__))
+    version = 'unknown'
+    for name in os.listdir(site_packages):
+        if name.startswith('musthe-') and name.endswith(('.dist-info', '.egg-info')):
+            version = name[len('musthe-'):].rsplit('.', 1)[0]
+    return (version, os.stat(musthe.__file__).st_mtime_ns)
+
+MUSTHE_VERSION = musthe_version()
+
+def source_hash(filename):
+    """Hash of a source file, so that entries computed by its code go stale when it is edited."""
+    with open(filename, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+def function_source(function):
+    """The source of a module level function, read from its file. Does what inspect.getsource() does here
+    without importing inspect, which is slow to import."""
+    code = function.__code__
+    with open(code.co_filename, encoding='utf-8') as f:
+        lines = f.read().splitlines()[code.co_firstlineno-1:]
+    end = 1
+    while end < len(lines) and (not lines[end].strip() or lines[end][0].isspace()):
+        end = end + 1
+    return "\n".join(lines[:end]).rstrip()
+
+def fingerprint(inputs):
+    """Hash of the musthe version, the cache version and the inputs an entry was computed from."""
+    return hashlib.blake2b(repr((MUSTHE_VERSION, CACHE_VERSION, inputs)).encode(), digest_size=16).hexdigest()
+
+class DiskCache():
+    """Derived tables kept between runs in one compact binary (marshal) file.
+    Each entry is stored with the fingerprint of its inputs, so a stale entry is simply not found."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        self.dirty = False
+
+    def load(self):
+        """Read the cache file. A missing, unreadable or old format file gives an empty cache."""
+        try:
+            with open(self.filename, 'rb') as f:
+                # One read and loads() is much faster than marshal.load() on the file.
+                data = marshal.loads(f.read())
+            if data['version'] == CACHE_VERSION:
+                self.entries = data['entries']
+        except (OSError, ValueError, EOFError, TypeError, KeyError):
+            self.entries = {}
+        return self
+
+    def lookup(self, name, inputs):
+        """The value stored for name, or None if there is none or it was computed from other inputs."""
+        try:
+            stored, value = self.entries[name]
+        except KeyError:
+            return None
+        if stored != fingerprint(inputs):
+            return None
+        return value
+
+    def store(self, name, inputs, value):
+        """Store value for name. It must be made of plain types marshal can write."""
+        self.entries[name] = (fingerprint(inputs), value)
+        self.dirty = True
+
+    def get(self, name, inputs, compute):
+        """The stored value for name and inputs, or compute() it and store it."""
+        value = self.lookup(name, inputs)
+        if value is None:
+            value = compute()
+            self.store(name, inputs, value)
+        return value
+
+    def save(self):
+        """Write the cache file if anything changed, through a temporary file so it is never half written."""
+        if not self.dirty:
+            return
+        temporary = self.filename + '.tmp'
+        try:
+            with open(temporary, 'wb') as f:
+                f.write(marshal.dumps({'version': CACHE_VERSION, 'entries': self.entries}))
+            os.replace(temporary, self.filename)
+            self.dirty = False
+        except OSError as e:
+            print(f"Could not write cache file {self.filename}: {e}")
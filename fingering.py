@@ -0,0 +1,100 @@
+from fretboard import Fretboard, MAX_FRET
+
+def candidates(note, open_midi, frets):
+    """Every (row, fret) where the MIDI note can be played, rows top-down as in Fretboard.build()."""
+    low, high = frets
+    return [ (row, note - open) for row, open in enumerate(open_midi) if low <= note - open <= high ]
+
+def fingering(midi_notes, tuning, frets=..., span=4, shift=1.0, slide=0.3, stretch=0.5, crossing=0.3, height=0.02):
+    """The cheapest (row, fret) path for playing midi_notes in turn on tuning (lowest string first),
+    optionally within frets=(<fromfret>, <tofret>). Rows are top-down as in Fretboard.build().
+
+    Viterbi over (row, fret, hand) states, hand being the fret under the index finger, which covers
+    span frets. Costs: shift for every change of hand position plus slide per fret moved, stretch for
+    reaching one fret outside the hand, crossing per string crossed, and height per fret up the neck.
+    Open strings leave the hand where it is. The time taken grows linearly with the number of notes.
+    Raises ValueError if a note can't be played."""
+    if frets == ...:
+        frets = (0, MAX_FRET)
+    open_midi = Fretboard(tuning=list(tuning)).open_midi
+    if not midi_notes:
+        return []
+
+    # (row, fret, hand) -> cost of the cheapest path there. hand is None until the first fretted note.
+    costs = {}
+    back = []
+    for note in midi_notes:
+        places = candidates(note, open_midi, frets)
+        if not places:
+            raise ValueError(f"MIDI note {note} can't be played in frets {frets[0]} to {frets[1]}.")
+        new_costs = {}
+        pointers = {}
+        for row, fret in places:
+            if fret == 0:
+                # An open string: the hand stays where it was.
+                if not costs:
+                    new_costs[(row, 0, None)] = 0.0
+                for before, cost in costs.items():
+                    state = (row, 0, before[2])
+                    cost = cost + crossing * abs(before[0] - row)
+                    if state not in new_costs or cost < new_costs[state]:
+                        new_costs[state] = cost
+                        pointers[state] = before
+                continue
+            for hand in range(max(1, fret - span), fret + 2):
+                finger = fret - hand
+                own = height * hand + (stretch if finger < 0 or finger >= span else 0)
+                state = (row, fret, hand)
+                if not costs:
+                    new_costs[state] = own
+                    continue
+                best, best_cost = None, None
+                for before, cost in costs.items():
+                    cost = cost + crossing * abs(before[0] - row)
+                    if before[2] is not None and before[2] != hand:
+                        cost = cost + shift + slide * abs(before[2] - hand)
+                    if best_cost is None or cost < best_cost:
+                        best, best_cost = before, cost
+                new_costs[state] = best_cost + own
+                pointers[state] = best
+        costs = new_costs
+        back.append(pointers)
+
+    # Walk back from the cheapest last state.
+    state = min(costs, key=costs.__getitem__)
+    path = [ state[:2] ]
+    for pointers in reversed(back[1:]):
+        state = pointers[state]
+        path.append(state[:2])
+    path.reverse()
+    return path
+
+def tab(path, tuning, width=80):
+    """ASCII tab of a fingering path, top string first as on the fretboard, wrapped at width characters."""
+    names = Fretboard(tuning=list(tuning)).tuning
+    label = max(len(name) for name in names)
+    columns = []
+    for row, fret in path:
+        text = str(fret)
+        columns.append([ (text if r == row else '-' * len(text)) + '-' for r in range(len(names)) ])
+
+    systems = []
+    line = []
+    length = label + 2
+    for column in columns:
+        if line and length + len(column[0]) + 1 > width:
+            systems.append(line)
+            line = []
+            length = label + 2
+        line.append(column)
+        length = length + len(column[0])
+    if line or not systems:
+        systems.append(line)
+
+    blocks = []
+    for line in systems:
+        rows = []
+        for r, name in enumerate(names):
+            rows.append(f"{name.ljust(label)}|-" + ''.join(column[r] for column in line) + '|')
+        blocks.append("\n".join(rows))
+    return "\n\n".join(blocks) + "\n"
@@ -1,9 +1,124 @@
+import heapq
+import itertools
+from collections import OrderedDict, namedtuple
+from types import MappingProxyType
 from musthe import *
 
+MAX_FRET = 24
+
+# The root notes offered on the command line.
+ROOT_NOTES = ['C','C#','Db','D','D#','Eb','E','F','F#','Gb','G','G#','Ab','A','A#','Bb','B',]
+
+# The root notes offered in the GUI, E# included for the circle of fifths.
+ALL_ROOT_NOTES = ['C','C#','Db','D','D#','Eb','E','E#','F','F#','Gb','G','G#','Ab','A','A#','Bb','B',]
+
+# Instrument presets: tuning (lowest string first), number of strings, fret window, title and fret markers.
+PRESETS = {
+    'ukulele': {
+        'tuning':   ['G4', 'C4', 'E4', 'A4'],
+        'strings':  4,
+        'frets':    (0,17),
+        'title':    "Ukulele",
+        'markers':  {
+            'single':   [3, 5, 7, 10, 15, 17, 19],
+            'double':   [12]
+        },
+    },
+    'guitar': {
+        'tuning':   ['E2', 'A2', 'D3', 'G3', 'B3', 'E4'],
+        'strings':  6,
+        'frets':    (0,24),
+        'title':    "6-string guitar",
+        'markers':  {
+            'single':   [3, 5, 7, 9, 15, 17, 19, 21],
+            'double':   [12]
+        },
+    },
+    '7-string': {
+        'tuning':   ['B1', 'E2', 'A2', 'D3', 'G3', 'B3', 'E4'],
+        'strings':  7,
+        'frets':    (0,24),
+        'title':    "7-string guitar",
+        'markers':  {
+            'single':   [3, 5, 7, 9, 15, 17, 19, 21],
+            'double':   [12]
+        },
+    },
+    'banjo': {
+        'tuning':   ['G4', 'D3', 'G3', 'B3', 'D4'],
+        'strings':  5,
+        'frets':    (0,24),
+        'title':    "Banjo",
+        'markers':  {
+            'single':   [3, 5, 7, 10, 15, 17, 19, 22],
+            'double':   [12]
+        },
+    },
+}
+
+# One row per pitch class, starting from C: sharp (or natural) spelling, flat (or natural) spelling, and the other enharmonics.
+ENHARMONICS = (
+    ('C',  'C',  'B#',  'Dbb'),
+    ('C#', 'Db'              ),
+    ('D',  'D',  'C##', 'Ebb'),
+    ('D#', 'Eb',        'Fbb'),
+    ('E',  'E',  'D##', 'Fb' ),
+    ('F',  'F',  'E#',  'Gbb'),
+    ('F#', 'Gb', 'E##'       ),
+    ('G',  'G',  'F##', 'Abb'),
+    ('G#', 'Ab'              ),
+    ('A',  'A',  'G##', 'Bbb'),
+    ('A#', 'Bb',        'Cbb'),
+    ('B',  'B',  'A##', 'Cb' ),
+)
+
+CIRCLE_OF_FIFTHS = [
+    'Db', 'Ab', 'Eb', 'Bb', 'F', 'C', 'G', 'D', 'A', 'E', 'B', 'F#',
+]
+
+Enharmonic = namedtuple('Enharmonic', ['pitch_class', 'sharp', 'flat', 'fifths'])
+
+def build_enharmonic_index():
+    """Map every spelling in ENHARMONICS to its pitch class, preferred sharp and flat spelling,
+    and its position on the CIRCLE_OF_FIFTHS."""
+    index = {}
+    for pc, row in enumerate(ENHARMONICS):
+        fifths = [ CIRCLE_OF_FIFTHS.index(n) for n in row if n in CIRCLE_OF_FIFTHS ][0]
+        entry = Enharmonic(pc, row[0], row[1], fifths)
+        for spelling in row:
+            index[spelling] = entry
+    return MappingProxyType(index)
+
+# Read-only spelling -> Enharmonic lookup, shared by the engine and the GUI.
+ENHARMONIC_INDEX = build_enharmonic_index()
+
+def pitch_class(note):
+    """Pitch class (0-11, C=0) of a note name like 'C#', 'Bbb' or 'E4'."""
+    try:
+        return ENHARMONIC_INDEX[note].pitch_class
+    except KeyError:
+        return Note(note).number % 12
+
+# The spelling of each pitch class on the CIRCLE_OF_FIFTHS, for naming notes found by pitch class alone.
+CIRCLE_SPELLINGS = tuple( [ n for n in CIRCLE_OF_FIFTHS if pitch_class(n) == pc ][0] for pc in range(12) )
+
+# A chord shape: frets has one entry per string, top-down as in Fretboard.build(), None for a muted string.
+# midi is the sounding notes, low to high, and score is lower for easier shapes.
+Voicing = namedtuple('Voicing', ['frets', 'midi', 'score'])
+
+# A scale position: system is 'box' (four-fret boxes, CAGED style) or '3nps' (three notes per string),
+# number counts from 1, frets is the (lowest, highest) fret used and cells the (row, fret) pairs
+# of its notes, rows top-down as in Fretboard.build().
+Position = namedtuple('Position', ['system', 'number', 'frets', 'cells'])
+
+POSITION_SYSTEMS = ('box', '3nps')
+
 class Fretboard():
     """Generate Fretboard object with tuning."""
-    def __init__(self, tuning=...):
-        """Fretboard(tuning=tuning) (a list of notes), defaults to ['E', 'A', 'D', 'G', 'B', 'E'])"""
+    def __init__(self, tuning=..., max_fret=MAX_FRET):
+        """Fretboard(tuning=tuning) (a list of notes), defaults to ['E', 'A', 'D', 'G', 'B', 'E'])
+        Optional max_fret sets the number of frets on the instrument, defaults to 24."""
+        self.max_fret = max_fret
 
         if tuning==...:
             tuning = ['E2', 'A2', 'D3', 'G3', 'B3', 'E4']
@@ -11,54 +126,34 @@ class Fretboard():
         if tuning==['E', 'A', 'D', 'G', 'B', 'E']:
             tuning = ['E2', 'A2', 'D3', 'G3', 'B3', 'E4']
 
-        self.enharmonics = [
-            ['C',  'C',  'B#',  'Dbb'],
-            ['C#', 'Db'              ],
-            ['D',  'D',  'C##', 'Ebb'],
-            ['D#', 'Eb',        'Fbb'],
-            ['E',  'E',  'D##', 'Fb' ],
-            ['F',  'F',  'E#',  'Gbb'],
-            ['F#', 'Gb', 'E##'       ],
-            ['G',  'G',  'F##', 'Abb'],
-            ['G#', 'Ab'              ],
-            ['A',  'A',  'G##', 'Bbb'],
-            ['A#', 'Bb',        'Cbb'],
-            ['B',  'B',  'A##', 'Cb' ],
-        ]
+        self.enharmonics = ENHARMONICS
 
         # Reverse tuning for "top-down view"
         self.tuning_with_octaves = tuning
         self.tuning_with_octaves = self.tuning_with_octaves[::-1]
         self.tuning = [ str(Note(n)) for n in self.tuning_with_octaves ]
 
+        # Open string midi notes; (open + fret) % 12 gives the pitch class of every slot.
+        self.open_midi = [ Note(n).midi_note() for n in self.tuning_with_octaves ]
+
         # Contains all the possible notes on the fretboard with a certain tuning
         self.all_the_notes = {}
-        string = 1
-
-        # For each tuning peg, build the fretboard
-        for peg in self.tuning:
-            index = 0
-
-            # Check where on the enharmonic list we begin our one-string chromatic scale
-            for e in self.enharmonics:
-                if peg in self.enharmonics[index]:
-                    # We have found our index and can build our chromatic scale
-                    all_the_notes = self.enharmonics[index:] + self.enharmonics[:index]
-                    all_the_notes = all_the_notes + all_the_notes # 23 frets
-                    all_the_notes.append(all_the_notes[0]) # 24 frets
-                    self.all_the_notes[string] = all_the_notes
-                    break
-                else:
-                    index = index + 1
-            string = string + 1
+        for string, midi in enumerate(self.open_midi, start=1):
+            self.all_the_notes[string] = [ self.enharmonics[(midi + fret) % 12] for fret in range(self.max_fret+1) ]
 
-    def build(self, chord=..., scale=..., frets=..., **kwargs):
-        """chord=<musthe Chord> OR scale=<musthe Scale>, optional frets=(<fromfret>, <tofret>)
+    def build(self, chord=..., scale=..., frets=..., harmony=..., **kwargs):
+        """chord=<musthe Chord> OR scale=<musthe Scale> OR harmony=<Harmony from the HarmonyTable>,
+        optional frets=(<fromfret>, <tofret>)
         Returns notes, intervals."""
-        if isinstance(chord, Chord):
+        if isinstance(harmony, Harmony):
+            self.harmony = harmony
+            self.notes = list(harmony.notes)
+            self.intervals = list(harmony.intervals)
+        elif isinstance(chord, Chord):
             self.chord = chord
             self.notes = [ str(n) for n in self.chord.notes ]
-            self.intervals = self.chord.recipes[self.chord.chord_type]
+            # Copy the recipe, so we don't delete the octave from musthe's class attribute.
+            self.intervals = list(self.chord.recipes[self.chord.chord_type])
             if 'P8' in self.intervals:
                 index = self.intervals.index('P8')
                 del self.notes[index]
@@ -74,87 +169,522 @@ class Fretboard():
             self.intervals = [ str(i) for i in self.scale.intervals ]
 
         if frets != ...:
-            self.frets = frets
-            if max(self.frets) > 24 or min(self.frets) < 0:
-                print("Frets must be between 0 and 24")
-                self.frets = (0, 24)
+            self.frets = tuple(frets)
+            if max(self.frets) > self.max_fret or min(self.frets) < 0:
+                print(f"Frets must be between 0 and {self.max_fret}")
+                self.frets = (0, self.max_fret)
         else:
-            self.frets = (0, 24)
+            self.frets = (0, self.max_fret)
 
         """Place all the submitted notes on the fretboard."""
-        notes_grid = []
-        intervals_grid = []
-        midi_grid = []
-
-        for tuning_peg in self.tuning_with_octaves:
-            note0 = Note(tuning_peg).midi_note()
-            midi_row = [ tone for tone in range(note0, note0+self.frets[1]+1) ]
-            midi_grid.append(midi_row)
+        # One lookup table from pitch class to (note, interval). The first note wins,
+        # just as notes.index() would pick it.
+        notes_by_pitch_class = [''] * 12
+        intervals_by_pitch_class = [''] * 12
+        for n, interval in zip(self.notes, self.intervals):
+            pc = pitch_class(n)
+            if notes_by_pitch_class[pc] == '':
+                notes_by_pitch_class[pc] = n
+                intervals_by_pitch_class[pc] = interval
 
-        if self.frets == (0, 24):
-            self.midi_grid = midi_grid
-        else:
-            self.midi_grid = []
-            for row in midi_grid:
-                self.midi_grid.append( row[self.frets[0]:self.frets[1]+1] )
-
-        # Go through all the possible enharmonic notes on each string
-        for string in self.all_the_notes.keys():
-            notes_row = []
-            intervals_row = []
-
-            # For each "slot" on the string, check if we find the desired note
-            for slot in self.all_the_notes[string]:
-                match = False
-                for n in self.notes:
-                    if n in slot:
-                        notes_row.append(n)
-                        intervals_row.append(self.intervals[ self.notes.index(n) ])
-                        match = True
-                if not match:
-                    notes_row.append("")
-                    intervals_row.append("")
-            notes_grid.append(notes_row)
-            intervals_grid.append(intervals_row)
-
-        if self.frets == (0, 24):
-            self.notes_grid = notes_grid
-            self.intervals_grid = intervals_grid
-        else:
-            self.notes_grid = []
-            self.intervals_grid = []
-            for row in notes_grid:
-                self.notes_grid.append( row[self.frets[0]:self.frets[1]+1] )
-            for row in intervals_grid:
-                self.intervals_grid.append( row[self.frets[0]:self.frets[1]+1] )
+        fret_range = range(self.frets[0], self.frets[1]+1)
+        self.notes_grid = []
+        self.intervals_grid = []
+        self.midi_grid = []
+        for note0 in self.open_midi:
+            midi_row = [ note0 + fret for fret in fret_range ]
+            self.midi_grid.append(midi_row)
+            self.notes_grid.append([ notes_by_pitch_class[tone % 12] for tone in midi_row ])
+            self.intervals_grid.append([ intervals_by_pitch_class[tone % 12] for tone in midi_row ])
 
         return self.notes_grid, self.intervals_grid, self.midi_grid
 
-    def printPlain(self):
-        """After running build(), this function can print a plain version of the fretboard to console."""
-        def plainprint(grid):
-            for row in grid:
-                for note in row:
-                    print(note.center(5), end="")
-                print()
-            for fret in range(self.frets[0], self.frets[1]+1):
-                if fret == 0:
-                    print("N".center(5), end="")
+    def voicings(self, harmony, span=4, fingers=4, mute=True, frets=...):
+        """harmony=<chord Harmony>, optional frets=(<fromfret>, <tofret>)
+        Generates the playable voicings of the chord as Voicing tuples, easiest first. Fretted notes lie within
+        span frets and need at most fingers fingers, a barre on the lowest fret counting as one unless
+        an open string sounds between its notes.
+        At most one muted string is allowed between sounding ones, and mute=False sounds every string."""
+        if frets == ...:
+            frets = (0, self.max_fret)
+        low, high = frets
+        target = harmony.mask
+        root = pitch_class(harmony.root)
+        strings = len(self.open_midi)
+        # Enough strings for the whole chord, and at least three if there are.
+        least = max(min(3, strings), len(harmony.pitch_classes))
+        heap = []
+        order = itertools.count()
+
+        def string_options(window):
+            """(fret, midi) choices for every string: muted, open, or fretted in the window."""
+            options = []
+            for open_midi in self.open_midi:
+                choices = []
+                if mute:
+                    choices.append((None, None))
+                if low == 0 and target & (1 << (open_midi % 12)):
+                    choices.append((0, open_midi))
+                if window is not None:
+                    for fret in range(window, min(window + span, high + 1)):
+                        if target & (1 << ((open_midi + fret) % 12)):
+                            choices.append((fret, open_midi + fret))
+                options.append(choices)
+            return options
+
+        def search(window):
+            """Depth first over the strings, pruned by what the remaining strings can still cover,
+            the fingers used and the muted strings. Scored shapes go on the heap."""
+            options = string_options(window)
+            position = window or 0
+            # can_cover[s]: the pitch classes strings s and up can still add.
+            can_cover = [0] * (strings + 1)
+            for s in range(strings-1, -1, -1):
+                can_cover[s] = can_cover[s+1]
+                for fret, midi in options[s]:
+                    if midi is not None:
+                        can_cover[s] = can_cover[s] | (1 << (midi % 12))
+            chosen = [None] * strings
+
+            # barre: notes on the window fret, split: an open string sounds between two of them, so they can't
+            # be barred and each takes a finger, opened: an open string sounds after the last of them so far.
+            # gap: muted strings since the last sounding one, inner: muted strings between sounding ones.
+            def place(s, covered, sounding, barre, split, opened, others, gap, inner, top, bass):
+                if covered | can_cover[s] != covered | target:
+                    return
+                used = others + (barre if split else min(barre, 1))
+                if used > fingers or inner > 1:
+                    return
+                if sounding + strings - s < least:
+                    return
+                if s == strings:
+                    if window is None or barre:
+                        # Lowest fret, stretch and fingers, muted strings, and the root not in the bass all cost.
+                        score = position + (top - position if top else 0) + used
+                        score = score + 2 * (strings - sounding) + 2 * inner
+                        if bass % 12 != root:
+                            score = score + 3
+                        heapq.heappush(heap, (score, next(order), tuple(chosen)))
+                    return
+                for fret, midi in options[s]:
+                    chosen[s] = fret
+                    if midi is None:
+                        place(s+1, covered, sounding, barre, split, opened, others, gap + (1 if sounding else 0), inner, top, bass)
+                        continue
+                    covers = covered | (1 << (midi % 12))
+                    lowest = midi if midi < bass else bass
+                    if fret == 0:
+                        place(s+1, covers, sounding+1, barre, split, bool(barre), others, 0, inner + gap, top, lowest)
+                    elif fret == window:
+                        place(s+1, covers, sounding+1, barre+1, split or opened, False, others, 0, inner + gap, max(top, fret), lowest)
+                    else:
+                        place(s+1, covers, sounding+1, barre, split, opened, others+1, 0, inner + gap, max(top, fret), lowest)
+                chosen[s] = None
+
+            place(0, 0, 0, 0, False, False, 0, 0, 0, 0, 128)
+
+        def voicing(entry):
+            score, n, shape = entry
+            midi = sorted( self.open_midi[s] + fret for s, fret in enumerate(shape) if fret is not None )
+            return Voicing(shape, tuple(midi), score)
+
+        # Open strings only, then one window per lowest fretted fret, so no voicing is found twice.
+        # A voicing's score is at least its lowest fret plus one for the finger on it, so everything
+        # scoring less than that for the next window can be handed out before searching further.
+        search(None)
+        for window in range(max(low, 1), high + 1):
+            while heap and heap[0][0] < window + 1:
+                yield voicing(heapq.heappop(heap))
+            search(window)
+        while heap:
+            yield voicing(heapq.heappop(heap))
+
+    def positions(self, harmony, system='box'):
+        """harmony=<scale Harmony>, system='box' or '3nps'
+        Returns the positions of the scale up the neck as Position tuples, numbered from 1.
+        '3nps' plays three notes on every string (two for scales of fewer than seven notes), one position
+        per note of the scale, starting from that note on the lowest string.
+        'box' starts the same way but keeps to four frets from the start, reaching one fret further either way
+        only when the next note can't be had otherwise. Boxes starting a fret or less apart, an octave around
+        included, cover the same frets, so only the one with the most notes is kept: the five CAGED positions
+        of a diatonic scale."""
+        notes, intervals, midi = self.build(harmony=harmony, frets=(0, self.max_fret))
+        # Lowest string first.
+        open_midi = self.open_midi[::-1]
+        rows = len(open_midi) - 1
+        in_scale = [ [ note != '' for note in row ] for row in notes[::-1] ]
+        scale_midi = sorted( m for m in range(open_midi[0], open_midi[-1] + self.max_fret + 1)
+                             if harmony.mask & (1 << (m % 12)) )
+        per_string = 3 if len(harmony.pitch_classes) >= 7 else 2
+
+        positions = []
+        starts = [ fret for fret in range(12) if in_scale[0][fret] ]
+        for start in starts:
+            cells = []
+            string = 0
+            on_string = 0
+            i = scale_midi.index(open_midi[0] + start)
+            while string < len(open_midi) and i < len(scale_midi):
+                m = scale_midi[i]
+                fret = m - open_midi[string]
+                next_fret = m - open_midi[string+1] if string < rows else None
+                if system == '3nps':
+                    move = on_string == per_string
+                elif fret <= start + 3:
+                    move = False
                 else:
-                    print(str(fret).center(5), end="")
-            print("\n")
+                    # Stretch a fret down on the next string, or else up on this one, but not past the last string.
+                    move = next_fret is None or next_fret >= max(start - 1, 0) or fret > start + 4
+                if move:
+                    string = string + 1
+                    on_string = 0
+                    continue
+                if fret < 0 or fret > self.max_fret:
+                    break
+                cells.append((rows - string, fret))
+                on_string = on_string + 1
+                i = i + 1
+            if not cells:
+                continue
+            frets = [ fret for row, fret in cells ]
+            positions.append((start, Position(system, 0, (min(frets), max(frets)), frozenset(cells))))
+
+        if system == 'box':
+            kept = []
+            for start, position in positions:
+                if kept and start - kept[-1][0] <= 1:
+                    if len(position.cells) > len(kept[-1][1].cells):
+                        kept[-1] = (start, position)
+                    continue
+                kept.append((start, position))
+            # The last box can be the first one again an octave up.
+            if len(kept) > 1 and kept[0][0] + 12 - kept[-1][0] <= 1:
+                if len(kept[-1][1].cells) > len(kept[0][1].cells):
+                    kept.pop(0)
+                else:
+                    kept.pop()
+            positions = kept
+        return [ position._replace(number=number) for number, (start, position) in enumerate(positions, start=1) ]
+
+    def identify(self, positions):
+        """positions=[(<string>, <fret>), ...], strings counted from 1 in the same (top-down) order as build().
+        Returns the chords these notes make, as ChordMatch tuples, best first."""
+        return harmony_table.identify([ self.open_midi[string-1] + fret for string, fret in positions ])
+
+    def plain(self):
+        """After running build(), returns a plain text version of the fretboard: notes, then intervals."""
+        def plaingrid(grid):
+            lines = [ "".join(note.center(5) for note in row) for row in grid ]
+            lines.append("".join(("N" if fret == 0 else str(fret)).center(5) for fret in range(self.frets[0], self.frets[1]+1)))
+            return "\n".join(lines) + "\n\n"
 
         def header():
+            if getattr(self, 'harmony', None) is not None:
+                return f'{self.harmony.root} {self.harmony.name} {self.harmony.kind}: {" ".join(self.harmony.all_notes)}\n'
             try:
-                print(f'{str(self.chord.notes[0])} {self.chord.chord_type} chord: {" ".join([str(n) for n in self.chord.notes])}')
+                return f'{str(self.chord.notes[0])} {self.chord.chord_type} chord: {" ".join([str(n) for n in self.chord.notes])}\n'
             except AttributeError:
                 try:
-                    print(f'{str(self.scale.root)} {self.scale.name} scale: {" ".join([str(n) for n in self.scale.notes])}')
+                    return f'{str(self.scale.root)} {self.scale.name} scale: {" ".join([str(n) for n in self.scale.notes])}\n'
                 except AttributeError:
-                    pass
+                    return ''
+
+        return header() + plaingrid(self.notes_grid) + header() + plaingrid(self.intervals_grid)
+
+    def printPlain(self):
+        """After running build(), this function can print a plain version of the fretboard to console."""
+        print(self.plain(), end="")
+
+class BuildCache():
+    """Bounded LRU cache of Fretboard.build() results."""
+    def __init__(self, maxsize=256):
+        """BuildCache(maxsize=256), the number of builds to keep."""
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        # Scale positions, by tuning, system and scale.
+        self.patterns = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(tuning, chord=..., scale=..., frets=..., harmony=...):
+        """Cache key: (tuning, chord or scale identity, root, fret window)."""
+        if isinstance(harmony, Harmony):
+            root = harmony.root
+            harmony = (harmony.kind, harmony.name)
+        elif isinstance(chord, Chord):
+            harmony = ('chord', chord.chord_type)
+            root = str(chord.notes[0])
+        elif isinstance(scale, Scale):
+            harmony = ('scale', scale.name)
+            root = str(scale.root)
+        else:
+            harmony = ('scale', 'major')
+            root = 'C'
+        if frets != ...:
+            frets = tuple(frets)
+        return (tuple(tuning), harmony, root, frets)
+
+    def build(self, tuning, chord=..., scale=..., frets=..., harmony=...):
+        """Same as Fretboard(tuning=tuning).build(...), but returns cached, read-only
+        (tuples of tuples) notes, intervals and midi grids."""
+        key = self.key(tuning, chord=chord, scale=scale, frets=frets, harmony=harmony)
+        try:
+            result = self.entries[key]
+            self.entries.move_to_end(key)
+            self.hits = self.hits + 1
+            return result
+        except KeyError:
+            self.misses = self.misses + 1
+
+        f = Fretboard(tuning=list(tuning))
+        grids = f.build(chord=chord, scale=scale, frets=frets, harmony=harmony)
+        # Tuples, so that no caller can change what the next caller gets.
+        result = tuple( tuple( tuple(row) for row in grid ) for grid in grids )
+
+        self.entries[key] = result
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions = self.evictions + 1
+        return result
+
+    def stats(self):
+        """Return a dict with hits, misses, evictions and current size."""
+        return {
+            'hits':         self.hits,
+            'misses':       self.misses,
+            'evictions':    self.evictions,
+            'size':         len(self.entries),
+            'maxsize':      self.maxsize,
+        }
+
+    def dump(self, tuning):
+        """The cached builds for tuning, as (key, result) pairs, oldest first, for saving to disk."""
+        tuning = tuple(tuning)
+        return tuple( (key, result) for key, result in self.entries.items() if key[0] == tuning )
+
+    def load(self, items):
+        """Put (key, result) pairs from dump() back in the cache, without counting them as misses."""
+        for key, result in items:
+            self.entries[key] = result
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def positions(self, tuning, harmony, system='box'):
+        """Same as Fretboard(tuning=tuning).positions(harmony, system), computed once per tuning and scale."""
+        key = (tuple(tuning), system, harmony.kind, harmony.root, harmony.name)
+        try:
+            result = self.patterns[key]
+            self.patterns.move_to_end(key)
+            return result
+        except KeyError:
+            pass
+        result = tuple(Fretboard(tuning=list(tuning)).positions(harmony, system))
+        self.patterns[key] = result
+        if len(self.patterns) > self.maxsize:
+            self.patterns.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Empty the cache and reset the counters."""
+        self.entries.clear()
+        self.patterns.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+build_cache = BuildCache()
+
+# One scale or chord, with everything the fretboard and the sound need, so musthe isn't needed on the hot path.
+# kind is 'scale' or 'chord', name the scale or chord type. notes and intervals are what goes on the fretboard
+# (the octave left out of chords), all_notes is every note of the musthe chord or scale, for titles.
+# midi is what to play: the chord's notes, or the scale from its root in octave 4.
+# mask is pitch_classes as a 12-bit int, bit n set for pitch class n, for the set queries in HarmonyTable.
+Harmony = namedtuple('Harmony', ['kind', 'root', 'name', 'notes', 'intervals', 'all_notes', 'pitch_classes', 'mask', 'midi'])
+
+def pitch_class_mask(notes):
+    """12-bit mask with bit n set for every note of pitch class n."""
+    mask = 0
+    for note in notes:
+        mask = mask | (1 << pitch_class(note))
+    return mask
+
+def make_harmony(kind, root, name):
+    """Build a Harmony with musthe."""
+    if kind == 'chord':
+        chord = Chord(Note(root), name)
+        all_notes = [ str(n) for n in chord.notes ]
+        notes = list(all_notes)
+        intervals = list(chord.recipes[chord.chord_type])
+        if 'P8' in intervals:
+            index = intervals.index('P8')
+            del notes[index]
+            del intervals[index]
+        midi = [ n.midi_note() for n in chord.notes ]
+    else:
+        scale = Scale(Note(root), name)
+        all_notes = [ str(n) for n in scale.notes ]
+        notes = list(all_notes)
+        intervals = [ str(i) for i in scale.intervals ]
+        note = Note(str(scale.notes[0]))
+        midi = [ (note + i).midi_note() for i in scale.intervals ]
+    return Harmony(kind, root, name, tuple(notes), tuple(intervals), tuple(all_notes),
+                   frozenset(pitch_class(n) for n in notes), pitch_class_mask(notes), tuple(midi))
+
+# A chord found from its notes: root and bass spelled as on the CIRCLE_OF_FIFTHS, name the chord type,
+# inversion 0 for root position, 1 for the second chord note in the bass and so on, and omitted the interval
+# left out of the chord, if any ('P5' or '').
+ChordMatch = namedtuple('ChordMatch', ['root', 'name', 'inversion', 'bass', 'omitted'])
+
+class HarmonyTable():
+    """Every scale and chord type for every root note, computed once.
+    Entries are made on first use, or all at once by fill()."""
+    def __init__(self, roots=ALL_ROOT_NOTES):
+        self.roots = roots
+        self.entries = {}
+        # Results of the set queries, by query and Harmony.
+        self.queries = {}
+        self.filled = False
+
+    def get(self, kind, root, name):
+        """The Harmony for kind ('scale' or 'chord'), root and name."""
+        key = (kind, root, name)
+        try:
+            return self.entries[key]
+        except KeyError:
+            pass
+        if kind == 'chord' and name in Chord.aliases:
+            # Same notes as the chord it's an alias for.
+            harmony = self.get(kind, root, Chord.aliases[name])._replace(name=name)
+        else:
+            harmony = make_harmony(kind, root, name)
+        self.entries[key] = harmony
+        return harmony
+
+    def scale(self, root, name):
+        return self.get('scale', root, name)
+
+    def chord(self, root, name):
+        return self.get('chord', root, name)
+
+    def fill(self):
+        """Compute every scale and chord type for every root, so that later lookups are just that."""
+        for root in self.roots:
+            for name in Scale.scales:
+                self.get('scale', root, name)
+            for name in Chord.valid_types:
+                self.get('chord', root, name)
+        self.filled = True
+
+    def all(self, kind):
+        """Every scale or chord of kind, without chord aliases, filling the table first if needed."""
+        key = ('all', kind)
+        try:
+            return self.queries[key]
+        except KeyError:
+            pass
+        self.fill()
+        harmonies = tuple( h for h in self.entries.values()
+                           if h.kind == kind and not (kind == 'chord' and h.name in Chord.aliases) )
+        self.queries[key] = harmonies
+        return harmonies
+
+    def scales_containing(self, chord):
+        """Every scale with all the notes of chord, on roots where the chord's root is spelled as in the scale.
+        Ordered by the scale root's distance above the chord root."""
+        key = ('scales containing', chord.root, chord.name)
+        try:
+            return self.queries[key]
+        except KeyError:
+            pass
+        mask = chord.mask
+        scales = [ s for s in self.all('scale') if mask & ~s.mask == 0 and chord.root in s.notes ]
+        base = pitch_class(chord.root)
+        scales.sort(key=lambda s: (pitch_class(s.root) - base) % 12)
+        scales = tuple(scales)
+        self.queries[key] = scales
+        return scales
+
+    def chords_in(self, scale):
+        """Every chord with all its notes in scale, on roots spelled as in the scale, ordered by scale degree."""
+        key = ('chords in', scale.root, scale.name)
+        try:
+            return self.queries[key]
+        except KeyError:
+            pass
+        mask = scale.mask
+        chords = [ c for c in self.all('chord') if c.mask & ~mask == 0 and c.root in scale.notes ]
+        chords.sort(key=lambda c: scale.notes.index(c.root))
+        chords = tuple(chords)
+        self.queries[key] = chords
+        return chords
+
+    def chord_index(self):
+        """Map the pitch-class mask of every chord type on every root to (root pitch class, name, pitch classes, omitted).
+        Chords of four notes or more are also there without their fifth."""
+        key = ('chord index',)
+        try:
+            return self.queries[key]
+        except KeyError:
+            pass
+        index = {}
+        for name in Chord.valid_types:
+            if name in Chord.aliases:
+                continue
+            # The pitch classes of the chord on C are its offsets from the root.
+            offsets = [ pitch_class(n) for n in self.chord('C', name).notes ]
+            for root in range(12):
+                pcs = tuple( (root + offset) % 12 for offset in offsets )
+                mask = sum( 1 << pc for pc in pcs )
+                index.setdefault(mask, []).append((root, name, pcs, ''))
+                fifth = (root + 7) % 12
+                if len(pcs) > 3 and fifth in pcs:
+                    index.setdefault(mask & ~(1 << fifth), []).append((root, name, pcs, 'P5'))
+        index = MappingProxyType({ mask: tuple(entries) for mask, entries in index.items() })
+        self.queries[key] = index
+        return index
+
+    def identify(self, midi_notes):
+        """The chords made by midi_notes, as ChordMatch tuples. Complete chords come before ones without
+        their fifth, root position before inversions, and chords with fewer notes first."""
+        if not midi_notes:
+            return []
+        mask = 0
+        for note in midi_notes:
+            mask = mask | (1 << (note % 12))
+        bass = min(midi_notes) % 12
+        order = { name: i for i, name in enumerate(Chord.valid_types) }
+        ranked = []
+        for root, name, pcs, omitted in self.chord_index().get(mask, ()):
+            inversion = pcs.index(bass)
+            match = ChordMatch(CIRCLE_SPELLINGS[root], name, inversion, CIRCLE_SPELLINGS[bass], omitted)
+            ranked.append(((omitted != '', inversion != 0, len(pcs), order[name]), match))
+        ranked.sort(key=lambda r: r[0])
+        return [ match for rank, match in ranked ]
+
+    @staticmethod
+    def common_tones(a, b):
+        """The notes of a that are also, by pitch class, in b."""
+        mask = a.mask & b.mask
+        return tuple( n for n in a.notes if mask & (1 << pitch_class(n)) )
+
+    def inputs(self):
+        """Everything the entries are computed from, to tell whether saved entries are stale."""
+        return (tuple(self.roots),
+                tuple( (name, tuple(intervals)) for name, intervals in Scale.scales.items() ),
+                tuple( (name, tuple(intervals)) for name, intervals in Chord.recipes.items() ),
+                tuple(Chord.aliases.items()))
+
+    def dump(self):
+        """The entries as plain tuples, for saving to disk."""
+        return tuple( tuple(harmony) for harmony in self.entries.values() )
 
-        header()
-        plainprint(self.notes_grid)
+    def load(self, harmonies):
+        """Add entries from dump()."""
+        for fields in harmonies:
+            harmony = Harmony(*fields)
+            self.entries[(harmony.kind, harmony.root, harmony.name)] = harmony
+        self.queries.clear()
 
-        header()
-        plainprint(self.intervals_grid)
+harmony_table = HarmonyTable()
@@ -5,27 +5,36 @@ import subprocess
 import platform
 import sys
 import re
+from startup_profiler import profiler
 from musthe import Note, Chord, Scale
+profiler.mark('import musthe')
 from PyQt5 import QtWidgets, QtCore, QtGui
+profiler.mark('import PyQt5')
 from fretboard_ui import Ui_MainWindow
-from fretboard import Fretboard
-from overloadedQtClasses import QLabelClickable
+from fretboard import Fretboard, build_cache, harmony_table, MAX_FRET, POSITION_SYSTEMS, ROOT_NOTES, ALL_ROOT_NOTES, PRESETS, CIRCLE_OF_FIFTHS, CIRCLE_SPELLINGS, ENHARMONIC_INDEX, pitch_class
+from overloadedQtClasses import QLabelClickable, QFretboardCanvas, QComboBoxFilledOnShow
 from helpDialog import HelpDialog
-import fretboard_rc
+from resources import register_resources
+from disk_cache import DiskCache, CACHEFILENAME, source_hash, function_source
+from fingering import fingering, tab
+from midi_file import write_midi, arpeggio_events, chord_events
+profiler.mark('import app modules')
 
 play_sounds = False
 
 try:
     from play_sounds import *
-    play_sounds = True
+    play_sounds = live_audio
+    if not play_sounds:
+        print("Install the pyaudio package if you want sound support. Exporting MIDI works without it.")
 except ModuleNotFoundError:
     print("Install the tinysoundfont package if you want sound support.")
+profiler.mark('import play_sounds')
 
 SETTINGSFILENAME = "fretboard_settings.json"
 
-CIRCLE_OF_FIFTHS = [
-    'Db', 'Ab', 'Eb', 'Bb', 'F', 'C', 'G', 'D', 'A', 'E', 'B', 'F#',
-]
+# The cached scales, chords and grids are computed by the code in fretboard.py, so editing it makes them stale.
+FRETBOARD_SOURCE = source_hash(sys.modules[Fretboard.__module__].__file__)
 
 MODES = {
     'lydian': -1,
@@ -51,9 +60,11 @@ help_messages = [
     ['M',       'Toggle between (M)ajor and (M)inor modes'],
     ['T',       'Change (T)uning'],
     ['S',       'Toggle between enharmonics for the key (S)ignature'],
+    ['V',       'Step through playable (V)oicings of the chord'],
+    ['E',       '(E)xport what <Enter> plays, or the voicing shown, as a MIDI file'],
     ['Fret buttons',    'Click to zoom in on frets'],
     ['Left click on note', 'Play note if sound support, otherwise toggle transparency'],
-    ['Ctrl+Left click on note', 'If sound support, toggle transparency'],
+    ['Ctrl+Left click on note', 'Toggle transparency, and show the chord the transparent notes make'],
     ['Right click on note', 'Set root note to the note below the cursor'],
     ['Left click on chord or scale', 'Play chord or scale.'],
     ['Right click on chord', 'Arpeggiate the chord'],
@@ -89,13 +100,12 @@ REPLACEMENT_STRINGS = {
     'aug ':  'augmented '
 }
 
-def eighteen_rule():
+def eighteen_rule(full_fretboard=2000, frets=25):
     """Create fret widths according to the 'rule of eighteen'."""
-    full_fretboard = 2000
     first_fret = full_fretboard / 18
     remaining = full_fretboard - first_fret
     fretWidths = [round(first_fret)]
-    for i in range(25):
+    for i in range(frets):
         next_fret = remaining/18
         remaining = remaining - next_fret
         fretWidths.append(round(next_fret))
@@ -108,13 +118,151 @@ def translate(string):
     string=string.replace('#', '♯')
     return string
 
+def label_clicked(label):
+    """Left click on a fretboard label: play or toggle the note, or play the scale if empty."""
+    if label.objectName() != '':
+        if play_sounds:
+            play('note', label.midi_note)
+        else:
+            toggle_transparency(label)
+            toggle_mark(label, label.midi_note)
+    elif play_sounds:
+        # Play chord or scale if empty label is clicked.
+        play('scale')
+
+def label_ctrl_clicked(label):
+    """Ctrl+left click on a fretboard label: toggle transparency, and show what chord the transparent notes make."""
+    if label.objectName() != '':
+        toggle_transparency(label)
+        toggle_mark(label, label.midi_note)
+
+def toggle_mark(key, midi_note):
+    """Add a note to the marked (transparent) notes, or take it away, and show what chord they make."""
+    if key in ui.marked:
+        del ui.marked[key]
+    else:
+        ui.marked[key] = midi_note
+    show_identified_chord()
+
+def chord_match_name(match):
+    """Short name of a ChordMatch, like 'C maj', 'A min7/C' or 'C dom7 (no 5)'."""
+    name = f"{match.root} {match.name}"
+    if match.inversion:
+        name = name + f"/{match.bass}"
+    if match.omitted == 'P5':
+        name = name + " (no 5)"
+    return name
+
+def show_identified_chord():
+    """Show the chords made by the marked notes in the status bar, best first."""
+    if len(ui.marked) < 2:
+        return
+    midi_notes = sorted(ui.marked.values())
+    notes = "  ".join(CIRCLE_SPELLINGS[n % 12] for n in midi_notes)
+    matches = harmony_table.identify(midi_notes)
+    if matches:
+        chords = ", ".join(chord_match_name(m) for m in matches[:5])
+    else:
+        chords = "no chord found"
+    ui.statusbar.showMessage(translate(f"{notes}: {chords}"), 10000)
+
+def label_selected(label):
+    """Right click on a fretboard label: arpeggiate if empty, then select root note."""
+    if label.objectName() == '' and play_sounds:
+        play('arpeggio')
+    select_root_from_label(label)
+
+def new_label(ui):
+    """Create a pooled fretboard label. The signals are connected once, and read the label's current note."""
+    label = QLabelClickable(ui.centralwidget)
+    label.midi_note = None
+    label.setAlignment(QtCore.Qt.AlignCenter)
+    label.setLineWidth(3)
+    font = QtGui.QFont()
+    font.setPointSize(12)
+    label.setFont(font)
+    label.clicked.connect(lambda x=label: label_clicked(x))
+    label.ctrl_clicked.connect(lambda x=label: label_ctrl_clicked(x))
+    label.selected.connect(lambda x=label: label_selected(x))
+    return label
+
+def new_fret_line(ui, i):
+    """Create a pooled fret line."""
+    line = QtWidgets.QFrame(ui.centralwidget)
+    line.setMinimumSize(QtCore.QSize(5, 5))
+    line.setFrameShadow(QtWidgets.QFrame.Raised)
+    line.setLineWidth(3)
+    line.setMidLineWidth(0)
+    line.setFrameShape(QtWidgets.QFrame.VLine)
+    line.setObjectName(f"freLine{i}")
+    return line
+
+def new_fret_button(ui):
+    """Create a pooled fret button. The fret it selects is kept in button.fret."""
+    button = QtWidgets.QPushButton(ui.centralwidget)
+    button.fret = None
+    font = QtGui.QFont()
+    font.setPointSize(12)
+    button.setFont(font)
+    button.setFocusPolicy(QtCore.Qt.ClickFocus)
+    if ui.tooltip:
+        button.setToolTip('Click two fret buttons to set the portion of fretboard to view.')
+    button.clicked.connect(lambda state, x=button: set_fret(x.fret))
+    return button
+
+def resize_pool(ui, rows, columns):
+    """Add or remove pooled labels, fret lines and fret buttons, so there are rows x columns of them."""
+    while len(ui.labels) > rows:
+        for label in ui.labels.pop():
+            clear_from_grid(label)
+    while len(ui.labels) < rows:
+        ui.labels.append([])
+
+    for i, row in enumerate(ui.labels):
+        while len(row) > columns:
+            clear_from_grid(row.pop())
+        while len(row) < columns:
+            label = new_label(ui)
+            ui.gridLayout.addWidget(label, i, 2*(len(row)+1)+1, 1, 1)
+            row.append(label)
+
+    while len(ui.lines) > columns:
+        clear_from_grid(ui.lines.pop())
+    while len(ui.lines) < columns:
+        line = new_fret_line(ui, len(ui.lines)+1)
+        ui.gridLayout.addWidget(line, 0, 2*(len(ui.lines)+1), ui.strings, 1)
+        ui.lines.append(line)
+
+    while len(ui.fretButtons) > columns:
+        clear_from_grid(ui.fretButtons.pop())
+    while len(ui.fretButtons) < columns:
+        button = new_fret_button(ui)
+        ui.gridLayout.addWidget(button, ui.strings, 2*(len(ui.fretButtons)+1)+1, 1, 1)
+        ui.fretButtons.append(button)
+
+def interval_type_of(interval):
+    """The key into INTERVAL_COLORS for an interval: its quality, or 'P1' for the root."""
+    if interval != "P1":
+        return interval[0]
+    return interval
+
+def note_interval_type(ui, notes, intervals, i, column):
+    """The interval type of the note or interval shown in column on row i."""
+    if ui.showInterval:
+        return interval_type_of(column)
+    try:
+        return interval_type_of(intervals[i][notes[i].index(column)])
+    except ValueError:
+        return ''
+
 def populate_fretboard(ui, notes, intervals, midi, frets):
-    """Set up all the labels with notes or intervals on them"""
-    ui.labels = []
+    """Set up all the labels with notes or intervals on them, or paint them if ui.painted."""
     if ui.showInterval:
         fretboard = intervals
     else:
         fretboard = notes
+    # Repopulating makes every note opaque again.
+    ui.marked = {}
 
     # We don't want to show the tuning after the nut as a fret, so we cut that column out.
     if min(frets) == 0:
@@ -123,151 +271,203 @@ def populate_fretboard(ui, notes, intervals, midi, frets):
             board.append(row[1: frets[1]+1])
         fretboard = board
 
-    # Setting up the labels...
+    frets = tuple(frets)
+    if ui.painted:
+        populate_canvas(ui, fretboard, notes, intervals, midi, frets)
+    else:
+        populate_labels(ui, fretboard, notes, intervals, midi, frets)
+
+    populate_tuning_pegs(ui, notes, intervals)
+    if play_sounds:
+        prefetch_fretboard(ui, midi)
+
+def prefetch_fretboard(ui, midi):
+    """Have the note cache render every note on the fretboard, when they change with the tuning or frets."""
+    notes = sorted({ note for row in midi for note in row })
+    if notes != ui.prefetched:
+        ui.prefetched = notes
+        prefetch_notes(notes)
+
+def populate_labels(ui, fretboard, notes, intervals, midi, frets):
+    """Set up the labels. They are kept in a pool, with the fret lines and buttons,
+    and only added or removed if the fret window changes."""
+    window_changed = (frets != ui.pool_frets)
+    if window_changed:
+        resize_pool(ui, len(fretboard), len(fretboard[0]))
+
+    # Setting up the labels, and the colors corresponding to the intervals.
     for i, row in enumerate(fretboard):
-        label_row = []
         for j, column in enumerate(row, start=1):
-            label = QLabelClickable(ui.centralwidget, text=translate(column))
-            if column != '':
-                if play_sounds:
-                    if ui.frets[0] == 0:
-                        # Leave out the first fret, as it's the nut.
-                        note = midi[i][j]
-                    else:
-                        note = midi[i][j-1]
-                    label.clicked.connect(lambda thing='note', note=note: play(thing, note))
-                    label.ctrl_clicked.connect(lambda x=label: toggle_transparency(x))
-                else:
-                    label.clicked.connect(lambda x=label: toggle_transparency(x))
-            else:
-                if play_sounds:
-                    # Play chord or scale if empty label is clicked.
-                    label.clicked.connect(lambda thing='scale': play(thing))
-                    label.selected.connect(lambda thing='arpeggio': play(thing))
-            label.selected.connect(lambda x=label: select_root_from_label(x))
-            label.setMinimumSize(QtCore.QSize(fretWidths[j+1], 40)) #(40, 40))
-            label.setMaximumSize(QtCore.QSize(fretWidths[j+1], 40)) #(40, 40))
+            label = ui.labels[i][j-1]
+            label.setText(translate(column))
             label.setObjectName(column)
-            font = QtGui.QFont()
-            font.setPointSize(12)
-            label.setFont(font)
-            ui.gridLayout.addWidget(label, i, 2*j+1, 1, 1)
-            label_row.append(label)
-        ui.labels.append(label_row)
-
-    # Setting up the colors corresponding to the intervals.
-    for i, row in enumerate(ui.labels):
-        for label in row:
-            if label.text() != '':
-                label.setAlignment(QtCore.Qt.AlignCenter)
-                label.setFrameShape(QtWidgets.QFrame.Box)
-                label.setLineWidth(3)
-                if ui.tooltip:
-                    if play_sounds:
-                        label.setToolTip('Left click to play note, Ctrl+left click to toggle transparency, right click to set root note.')
-                    else:
-                        label.setToolTip('Left click to toggle transparency, right click to set root note.')
-                if ui.showInterval:
-                    interval =  label.objectName()
-                    if interval != "P1":
-                        interval_type = interval[0]
-                    else:
-                        interval_type = interval
-                else:
-                    try:
-                        interval = intervals[i][notes[i].index(label.objectName())]
-                        if interval != "P1":
-                            interval_type = interval[0]
-                        else:
-                            interval_type = interval
-                    except ValueError:
-                        interval_type = ''
-                label.setStyleSheet("QLabel"
-                            "{"
-                            "border : 3px solid ;"
-                            f"{INTERVAL_COLORS.get(interval_type, LABEL_COLORS[6])}"
-                            "border-color : black"
-                            "}")
-
-    # Set up the frets themselves as ui lines.
-    ui.lines = []
-    for i in range(1, len(ui.labels[0])+1):
-        line = QtWidgets.QFrame(ui.centralwidget)
-        line.setMinimumSize(QtCore.QSize(5, 5))
-        line.setFrameShadow(QtWidgets.QFrame.Raised)
-        line.setLineWidth(3)
-        line.setMidLineWidth(0)
-        line.setFrameShape(QtWidgets.QFrame.VLine)
-        line.setObjectName(f"freLine{i}")
-        ui.gridLayout.addWidget(line, 0, 2*i, ui.strings, 1)
-        ui.lines.append(line)
-        i = i + 1
+            if window_changed:
+                label.setMinimumSize(QtCore.QSize(fretWidths[j+1], 40)) #(40, 40))
+                label.setMaximumSize(QtCore.QSize(fretWidths[j+1], 40)) #(40, 40))
+            if label.transparency:
+                label.setGraphicsEffect(None)
+                label.transparency = False
+
+            if column == '':
+                label.midi_note = None
+                label.setFrameShape(QtWidgets.QFrame.NoFrame)
+                label.setStyleSheet('')
+                label.setToolTip('')
+                continue
+
+            if ui.frets[0] == 0:
+                # Leave out the first fret, as it's the nut.
+                label.midi_note = midi[i][j]
+            else:
+                label.midi_note = midi[i][j-1]
 
-    # Set up the fret buttons.
-    fret_marker = "●"
-    ui.fretMarkers = []
-    ui.fretButtons = []
-    j = 1
-    for fret in range(frets[0], frets[1]+1):
-        if fret > 0:
-            button = QtWidgets.QPushButton(ui.centralwidget)
-            button.setMinimumSize(QtCore.QSize(fretWidths[fret - frets[0]+1], 40)) #(40, 40))
-            button.setMaximumSize(QtCore.QSize(fretWidths[fret - frets[0]+1], 40)) #(40, 40))
-            font = QtGui.QFont()
-            font.setPointSize(12)
-            button.setFont(font)
-            button.setObjectName("fretButton" + str(fret))
-            button.setText(str(fret))
-            button.setFocusPolicy(QtCore.Qt.ClickFocus)
+            label.setFrameShape(QtWidgets.QFrame.Box)
             if ui.tooltip:
-                button.setToolTip('Click two fret buttons to set the portion of fretboard to view.')
-            ui.gridLayout.addWidget(button, ui.strings, 2*j+1, 1, 1)
-            ui.fretButtons.append(button)
-            button.clicked.connect(lambda state, x=fret: set_fret(x))
-            j = j + 1
-        if fret in ( ui.markers['single'] + ui.markers['double'] ):
-            dot = QtWidgets.QLabel(ui.centralwidget, text=translate(column))
-            dot.setAlignment(QtCore.Qt.AlignCenter)
-            if fret in ui.markers['single']:
-                dot.setText(fret_marker)
+                if play_sounds:
+                    label.setToolTip('Left click to play note, Ctrl+left click to toggle transparency, right click to set root note.')
+                else:
+                    label.setToolTip('Left click to toggle transparency, right click to set root note.')
+            interval_type = note_interval_type(ui, notes, intervals, i, column)
+            label.setStyleSheet("QLabel"
+                        "{"
+                        "border : 3px solid ;"
+                        f"{INTERVAL_COLORS.get(interval_type, LABEL_COLORS[6])}"
+                        "border-color : black"
+                        "}")
+
+    if window_changed:
+        # Set up the fret buttons and the dots.
+        for dot in ui.fretMarkers:
+            clear_from_grid(dot)
+        fret_marker = "●"
+        ui.fretMarkers = []
+        j = 1
+        for fret in range(frets[0], frets[1]+1):
+            if fret > 0:
+                button = ui.fretButtons[j-1]
+                button.setMinimumSize(QtCore.QSize(fretWidths[fret - frets[0]+1], 40)) #(40, 40))
+                button.setMaximumSize(QtCore.QSize(fretWidths[fret - frets[0]+1], 40)) #(40, 40))
+                button.setObjectName("fretButton" + str(fret))
+                button.setText(str(fret))
+                button.fret = fret
+                j = j + 1
+            if fret in ( ui.markers['single'] + ui.markers['double'] ):
+                dot = QtWidgets.QLabel(ui.centralwidget)
+                dot.setAlignment(QtCore.Qt.AlignCenter)
+                if fret in ui.markers['single']:
+                    dot.setText(fret_marker)
+                else:
+                    dot.setText(fret_marker+fret_marker)
+                ui.gridLayout.addWidget(dot, ui.strings+1, 2*j-1, 1, 1)
+                ui.fretMarkers.append(dot)
+        ui.pool_frets = frets
+
+def style_colors(style):
+    """Background and text QColor from one of the INTERVAL_COLORS or LABEL_COLORS style sheets."""
+    colors = {}
+    for name, value in re.findall(r'(background-color|(?<![-\w])color)\s*:\s*([^;]+);', style):
+        rgba = re.match(r'rgba\((\d+),\s*(\d+),\s*(\d+),\s*(\d+)%\)', value)
+        if rgba:
+            r, g, b, alpha = [ int(v) for v in rgba.groups() ]
+            colors[name] = QtGui.QColor(r, g, b, round(alpha*2.55))
+        else:
+            colors[name] = QtGui.QColor(value.strip())
+    return colors.get('background-color', QtGui.QColor('white')), colors.get('color', QtGui.QColor('black'))
+
+def canvas_clicked(row, column):
+    """Left click on a painted note: play or toggle it, or play the scale if empty."""
+    if ui.canvas.notes[row][column] != '':
+        if play_sounds:
+            play('note', ui.canvas.midi[row][column])
+        else:
+            ui.canvas.toggle_transparency(row, column)
+            toggle_mark((row, column), ui.canvas.midi[row][column])
+    elif play_sounds:
+        play('scale')
+
+def canvas_ctrl_clicked(row, column):
+    """Ctrl+left click on a painted note: toggle transparency, and show what chord the transparent notes make."""
+    if ui.canvas.notes[row][column] != '':
+        ui.canvas.toggle_transparency(row, column)
+        toggle_mark((row, column), ui.canvas.midi[row][column])
+
+def canvas_selected(row, column):
+    """Right click on a painted note: arpeggiate if empty, then select root note."""
+    if ui.canvas.notes[row][column] == '' and play_sounds:
+        play('arpeggio')
+    select_root_from_label(ui.canvas.notes[row][column])
+
+def setup_canvas(ui):
+    """Create the custom-painted fretboard, in place of the labels, fret lines and buttons."""
+    ui.canvas = QFretboardCanvas(ui.centralwidget)
+    spacing = ui.gridLayout.verticalSpacing()
+    if spacing >= 0:
+        ui.canvas.spacing = spacing
+    if ui.tooltip:
+        if play_sounds:
+            ui.canvas.setToolTip('Left click to play note, Ctrl+left click to toggle transparency, right click to set root note. Click two fret numbers to zoom.')
+        else:
+            ui.canvas.setToolTip('Left click to toggle transparency, right click to set root note. Click two fret numbers to zoom.')
+    ui.canvas.clicked.connect(canvas_clicked)
+    ui.canvas.ctrl_clicked.connect(canvas_ctrl_clicked)
+    ui.canvas.selected.connect(canvas_selected)
+    ui.canvas.fretClicked.connect(set_fret)
+    ui.gridLayout.addWidget(ui.canvas, 0, 1, ui.strings+2, 1)
+
+def populate_canvas(ui, fretboard, notes, intervals, midi, frets):
+    """Hand the notes, colors, fret numbers and markers to the custom-painted fretboard."""
+    if ui.canvas is None:
+        setup_canvas(ui)
+
+    cells = []
+    for i, row in enumerate(fretboard):
+        cell_row = []
+        for column in row:
+            if column == '':
+                cell_row.append(None)
             else:
-                dot.setText(fret_marker+fret_marker)
-            ui.gridLayout.addWidget(dot, ui.strings+1, 2*j-1, 1, 1)
-            ui.fretMarkers.append(dot)
+                interval_type = note_interval_type(ui, notes, intervals, i, column)
+                background, foreground = style_colors(INTERVAL_COLORS.get(interval_type, LABEL_COLORS[6]))
+                cell_row.append((translate(column), background, foreground))
+        cells.append(cell_row)
+
+    # Leave out the first fret if it's the nut, as for the labels.
+    first = 1 if frets[0] == 0 else 0
+    ui.canvas.notes = fretboard
+    ui.canvas.midi = [ row[first:] for row in midi ]
+
+    columns = len(fretboard[0])
+    fret_numbers = [ fret for fret in range(frets[0], frets[1]+1) if fret > 0 ]
+    fret_marker = "●"
+    markers = {}
+    for column, fret in enumerate(fret_numbers):
+        if fret in ui.markers['single']:
+            markers[column] = fret_marker
+        elif fret in ui.markers['double']:
+            markers[column] = fret_marker+fret_marker
+    ui.canvas.set_board(cells, [ fretWidths[j+1] for j in range(1, columns+1) ], fret_numbers, markers)
+
+def populate_tuning_pegs(ui, notes, intervals):
+    """Set up the "tuning peg" values and interval colors if open strings are on the chord or scale."""
+    # The interval of each pitch class on the fretboard, the first one found.
+    interval_by_pitch_class = {}
+    for row_notes, row_intervals in zip(notes, intervals):
+        for note, note_interval in zip(row_notes, row_intervals):
+            if note != '':
+                interval_by_pitch_class.setdefault(pitch_class(note), note_interval)
 
-    # Set up the "tuning peg" values and interval colors if open strings are on the chord or scale.
     for i, peg in enumerate(ui.tuningButtons):
         text = ui.tuning[i]
         peg.setStyleSheet("QLineEdit")
 
-        interval = ''
-        interval_type = ''
-        for row_notes, row_intervals in zip(notes, intervals):
-            if text in row_notes:
-                interval = row_intervals[row_notes.index(text)]
-                interval_type = interval[0] if interval != "P1" else interval
-                break
-
-        for row_notes, row_intervals in zip(notes, intervals):
-            for note, note_interval in zip(row_notes, row_intervals):
-                if text == note:
-                    peg.setStyleSheet("QLineEdit"
-                                "{"
-                                "border : 3px solid ;"
-                                f"{INTERVAL_COLORS.get(interval_type, LABEL_COLORS[6])}"
-                                "border-color : black"
-                                "}")
-                else:
-                    for enharmonic_row in ui.enharmonics:
-                        if (text in enharmonic_row and note in enharmonic_row):
-                            interval = note_interval
-                            interval_type = interval[0] if interval != "P1" else interval
-                            peg.setStyleSheet("QLineEdit"
-                                        "{"
-                                        "border : 3px solid ;"
-                                        f"{INTERVAL_COLORS.get(interval_type, LABEL_COLORS[6])}"
-                                        "border-color : black"
-                                        "}")
+        interval = interval_by_pitch_class.get(pitch_class(text))
+        if interval is not None:
+            peg.setStyleSheet("QLineEdit"
+                        "{"
+                        "border : 3px solid ;"
+                        f"{INTERVAL_COLORS.get(interval_type_of(interval), LABEL_COLORS[6])}"
+                        "border-color : black"
+                        "}")
         peg.rootNote = text
         peg.setText(translate(text))
 
@@ -276,16 +476,8 @@ def find_key_signature():
     signature = 0
     index = 0
     root_note = ui.rootNoteSelector.currentText()
-    if root_note in CIRCLE_OF_FIFTHS:
-        index = CIRCLE_OF_FIFTHS.index(root_note)
-    else:
-        for row in ui.enharmonics:
-            if root_note in row:
-                for note in row:
-                    if note in CIRCLE_OF_FIFTHS:
-                        index = CIRCLE_OF_FIFTHS.index(note)
-                        break
-                break
+    if root_note in ENHARMONIC_INDEX:
+        index = ENHARMONIC_INDEX[root_note].fifths
 
     ui.circle_of_fifths.setValue(index+1)
     
@@ -326,16 +518,11 @@ def select_root_from_label(thing):
         selected = thing.rootNote
 
     # Set the root note to the note right-clicked.
-    if selected in ui.rootNotes:
+    if selected in ui.rootNoteSet:
         ui.rootNoteSelector.setCurrentText(selected)
-    else:
-        # If needed: Look up enharmonics.
-        for row in ui.enharmonics:
-            if selected in row:
-                for note in row:
-                    if note in ui.rootNotes:
-                        ui.rootNoteSelector.setCurrentText(note)
-                        break
+    elif selected in ENHARMONIC_INDEX:
+        # If needed: Look up enharmonics, the sharp spelling is always a root note.
+        ui.rootNoteSelector.setCurrentText(ENHARMONIC_INDEX[selected].sharp)
     change_scale_or_chord()
     if back_to_root:
         select('root') #ui.rootNoteSelector.setFocus()
@@ -351,12 +538,213 @@ def toggle_transparency(label):
     label.setGraphicsEffect(ui.opacity_effect)
     label.transparency = not label.transparency
 
+def setup_voicing_panel(ui):
+    """Add a row under the fretboard for stepping through the playable voicings of the chord."""
+    ui.voicingPanel = QtWidgets.QWidget(ui.centralwidget)
+    layout = QtWidgets.QHBoxLayout(ui.voicingPanel)
+    layout.setContentsMargins(0, 0, 0, 0)
+    font = QtGui.QFont()
+    font.setPointSize(12)
+
+    ui.voicingPrevious = QtWidgets.QPushButton('◀', ui.voicingPanel)
+    ui.voicingNext = QtWidgets.QPushButton('▶', ui.voicingPanel)
+    ui.voicingLabel = QtWidgets.QLabel(ui.voicingPanel)
+    ui.spanSelector = QtWidgets.QSpinBox(ui.voicingPanel)
+    ui.spanSelector.setRange(2, 7)
+    ui.spanSelector.setValue(4)
+    ui.spanSelector.setPrefix('Span ')
+    ui.fingersSelector = QtWidgets.QSpinBox(ui.voicingPanel)
+    ui.fingersSelector.setRange(1, 4)
+    ui.fingersSelector.setValue(4)
+    ui.fingersSelector.setPrefix('Fingers ')
+    for widget in (ui.voicingPrevious, ui.voicingLabel, ui.voicingNext, ui.spanSelector, ui.fingersSelector):
+        widget.setFont(font)
+        widget.setFocusPolicy(QtCore.Qt.ClickFocus)
+        layout.addWidget(widget)
+    layout.addStretch()
+    if ui.tooltip:
+        ui.voicingLabel.setToolTip('Playable voicings of the chord in the frets shown, easiest first, lowest string first.')
+
+    ui.voicingPrevious.clicked.connect(lambda state, step=-1: step_voicing(step))
+    ui.voicingNext.clicked.connect(lambda state, step=1: step_voicing(step))
+    ui.spanSelector.valueChanged['int'].connect(update)
+    ui.fingersSelector.valueChanged['int'].connect(update)
+
+    # Right under the fretboard.
+    ui.verticalLayout.insertWidget(ui.verticalLayout.indexOf(ui.gridLayout) + 1, ui.voicingPanel)
+
+def reset_voicings(ui):
+    """Forget the voicings found so far, e.g. because the chord, tuning or frets changed."""
+    ui.voicings = None
+    ui.voicingList = []
+    ui.voicingIndex = -1
+    ui.voicingLabel.setText('Voicings')
+    ui.voicingPanel.setVisible(bool(ui.showChord))
+
+def step_voicing(step):
+    """Show the next (step=1) or previous (step=-1) voicing of the chord, searching for more only when needed."""
+    if not ui.showChord:
+        return
+    if ui.voicings is None:
+        f = Fretboard(tuning=ui.tuning_with_octave)
+        ui.voicings = f.voicings(ui.chord, span=ui.spanSelector.value(), fingers=ui.fingersSelector.value(), frets=ui.frets)
+    index = ui.voicingIndex + step
+    if index >= len(ui.voicingList):
+        try:
+            ui.voicingList.append(next(ui.voicings))
+        except StopIteration:
+            # Start over at the easiest one.
+            index = 0
+    if not ui.voicingList:
+        ui.voicingLabel.setText('No voicings in these frets')
+        return
+    ui.voicingIndex = max(index, 0)
+    voicing = ui.voicingList[ui.voicingIndex]
+    highlight_voicing(ui, voicing)
+    shape = " ".join('x' if fret is None else str(fret) for fret in reversed(voicing.frets))
+    ui.voicingLabel.setText(f"Voicing {ui.voicingIndex + 1}:  {shape}")
+    if play_sounds:
+        play_chord(list(voicing.midi))
+
+def highlight_voicing(ui, voicing):
+    """Make every note outside the voicing transparent."""
+    highlight_cells(ui, { (row, fret) for row, fret in enumerate(voicing.frets) if fret is not None })
+
+def highlight_cells(ui, cells):
+    """Make every note that isn't at one of the (row, fret) cells transparent."""
+    ui.marked = {}
+    if ui.painted:
+        ui.canvas.transparent = { (row, column) for row, cell_row in enumerate(ui.canvas.cells)
+                                  for column, cell in enumerate(cell_row)
+                                  if cell is not None and (row, ui.canvas.frets[column]) not in cells }
+        ui.canvas.update()
+        return
+    for row, labels in enumerate(ui.labels):
+        for column, label in enumerate(labels):
+            if label.objectName() == '':
+                continue
+            if label.transparency != ((row, ui.fretButtons[column].fret) not in cells):
+                toggle_transparency(label)
+
+POSITION_NAMES = {
+    'box':  'Box',
+    '3nps': '3 notes per string',
+}
+
+def setup_position_panel(ui):
+    """Add a row under the fretboard for picking a position of the scale to zoom in on."""
+    ui.positionPanel = QtWidgets.QWidget(ui.centralwidget)
+    layout = QtWidgets.QHBoxLayout(ui.positionPanel)
+    layout.setContentsMargins(0, 0, 0, 0)
+    font = QtGui.QFont()
+    font.setPointSize(12)
+    ui.positionSelector = QComboBoxFilledOnShow(ui.positionPanel)
+    ui.positionSelector.setFont(font)
+    ui.positionSelector.setFocusPolicy(QtCore.Qt.ClickFocus)
+    ui.positionSelector.setSizeAdjustPolicy(QtWidgets.QComboBox.AdjustToContents)
+    if ui.tooltip:
+        ui.positionSelector.setToolTip('Zoom in on a position of the scale.')
+    layout.addWidget(ui.positionSelector)
+    ui.fingeringButton = QtWidgets.QPushButton('Fingering', ui.positionPanel)
+    ui.saveTabButton = QtWidgets.QPushButton('Save tab', ui.positionPanel)
+    for button in (ui.fingeringButton, ui.saveTabButton):
+        button.setFont(font)
+        button.setFocusPolicy(QtCore.Qt.ClickFocus)
+        layout.addWidget(button)
+    ui.saveTabButton.setEnabled(False)
+    if ui.tooltip:
+        ui.fingeringButton.setToolTip('Show the easiest way to play the scale in the frets shown.')
+        ui.saveTabButton.setToolTip('Save the fingering as tab.')
+    layout.addStretch()
+
+    ui.fingeringButton.clicked.connect(show_fingering)
+    ui.saveTabButton.clicked.connect(save_tab)
+    ui.positionSelector.aboutToShowPopup.connect(fill_position_selector)
+    ui.positionSelector.activated['int'].connect(select_position)
+    ui.verticalLayout.insertWidget(ui.verticalLayout.indexOf(ui.voicingPanel) + 1, ui.positionPanel)
+
+def refresh_positions(ui):
+    """Forget the positions if the tuning or scale changed, or else keep the chosen one coloured."""
+    ui.positionPanel.setVisible(not ui.showChord)
+    if ui.showChord:
+        return
+    key = (tuple(ui.tuning_with_octave), ui.scale.root, ui.scale.name)
+    if key != ui.positionKey:
+        ui.positionKey = key
+        ui.positions = None
+        ui.fingeringPath = None
+        ui.saveTabButton.setEnabled(False)
+        ui.positionSelector.clear()
+        ui.positionSelector.addItem('Whole neck')
+    elif ui.positionSelector.currentIndex() > 0:
+        highlight_cells(ui, ui.positions[ui.positionSelector.currentIndex() - 1].cells)
+
+def fill_position_selector():
+    """List the positions of the scale, when the selector is opened. They're computed once per tuning and scale."""
+    if ui.positions is not None:
+        return
+    ui.positions = []
+    for system in POSITION_SYSTEMS:
+        ui.positions.extend(build_cache.positions(ui.tuning_with_octave, ui.scale, system))
+    for position in ui.positions:
+        ui.positionSelector.addItem(f"{POSITION_NAMES[position.system]} {position.number}: "
+                                    f"frets {position.frets[0]} to {position.frets[1]}")
+
+def show_fingering():
+    """Work out the easiest string and fret for every note of the scale, as play() plays it,
+    within the frets shown, and show the path on the fretboard."""
+    path = None
+    # Try the octave play() uses first, then the ones around it, for instruments it doesn't suit.
+    for octave in (0, -12, 12, -24):
+        try:
+            path = fingering([ m + octave for m in ui.scale.midi ], ui.tuning_with_octave, frets=ui.frets)
+            break
+        except ValueError:
+            pass
+    if path is None:
+        ui.statusbar.showMessage("The scale can't be played in these frets.", 10000)
+        return
+    ui.fingeringPath = path
+    ui.saveTabButton.setEnabled(True)
+    highlight_cells(ui, set(path))
+    frets = [ fret for row, fret in path ]
+    ui.statusbar.showMessage(f"Fingering of {len(path)} notes, frets {min(frets)} to {max(frets)}.", 10000)
+
+def save_tab():
+    """Save the last fingering as ASCII tab."""
+    if not ui.fingeringPath:
+        return
+    suggestion = f"{ui.scale.root} {ui.scale.name}.txt"
+    filename, selected_filter = QtWidgets.QFileDialog.getSaveFileName(main_window, 'Save tab', suggestion, 'Text files (*.txt)')
+    if not filename:
+        return
+    try:
+        with open(filename, 'w') as f:
+            f.write(tab(ui.fingeringPath, ui.tuning_with_octave))
+        ui.statusbar.showMessage(f"Wrote tab to {filename}.", 10000)
+    except OSError as e:
+        ui.statusbar.showMessage(f"Could not write {filename}: {e}", 10000)
+
+def select_position(index):
+    """Zoom in on the chosen position, as set_fret does, or back out to the whole neck."""
+    ui.frets_old = ui.frets
+    if index <= 0 or ui.positions is None:
+        ui.frets = ui.resetFrets
+    else:
+        ui.frets = ui.positions[index - 1].frets
+    update()
+    ui.statusbar.showMessage(f"{ui.positionSelector.currentText()}.", 10000)
+    select('root')
+
 def set_fret(fret):
     """Set new fret selection."""
     if not ui.fretSelected:
         # Is this the first or the second fret selected in the range?
         ui.fretSelected = True
         ui.firstFretSelected = fret
+        if ui.painted:
+            ui.canvas.highlight_column(ui.canvas.frets.index(fret))
+            ui.statusbar.showMessage("Click the next fret to zoom in on the fretboard.", 10000)
         for row in ui.labels:
             try:
                 index = fret - ui.frets[0]
@@ -377,6 +765,7 @@ def set_fret(fret):
             ui.frets_old = ui.frets
             ui.frets = (ui.firstFretSelected, ui.secondFretSelected)
             ui.frets = tuple(sorted(ui.frets)) # You can select in any order.
+            ui.positionSelector.setCurrentIndex(0)
             update()
             ui.statusbar.showMessage(f"Zooming in on frets {str(ui.frets[0])} to {str(ui.frets[1])}.", 10000)
         else:
@@ -409,7 +798,7 @@ def update():
                 ui.scaleOrChordTypeSelector.setCurrentText('min')
             type = ui.scaleOrChordTypeSelector.currentText()
             root = ui.rootNoteSelector.currentText()
-            ui.chord = Chord(Note(root), type)
+            ui.chord = harmony_table.chord(root, type)
         else:
             ui.scaleOrChordTypeSelector.clear()
             ui.scaleOrChordTypeSelector.addItems(ui.allScales)
@@ -417,43 +806,25 @@ def update():
                 ui.scaleOrChordTypeSelector.setCurrentText('natural_minor')
             type = ui.scaleOrChordTypeSelector.currentText()
             root = ui.rootNoteSelector.currentText()
-            ui.scale = Scale(Note(root), type)
-
-    # Re-build the labels. First remove the old ones.
-    for row in ui.labels:
-        for label in row:
-            clear_from_grid(label)
-
-    # Remove the buttons as well.
-    for button in ui.fretButtons:
-        clear_from_grid(button)
+            ui.scale = harmony_table.scale(root, type)
 
-    # And the fret lines:
-    for line in ui.lines:
-        clear_from_grid(line)
-
-    # And the dots:
-    for dot in ui.fretMarkers:
-        clear_from_grid(dot)
-
-    # Generate the new notes and intervals.
-    f = Fretboard(tuning=ui.tuning_with_octave)
+    # Generate the new notes and intervals, or fetch them from the build cache.
     if ui.showChord:
-        notes, intervals, midi = f.build(chord=ui.chord, frets=ui.frets)
+        notes, intervals, midi = build_cache.build(ui.tuning_with_octave, harmony=ui.chord, frets=ui.frets)
     else:
-        notes, intervals, midi = f.build(scale=ui.scale, frets=ui.frets)
+        notes, intervals, midi = build_cache.build(ui.tuning_with_octave, harmony=ui.scale, frets=ui.frets)
 
-    # Generate and populate the new fretboard.
+    # Populate the fretboard, re-using the labels already on it.
     populate_fretboard(ui, notes, intervals, midi, ui.frets)
 
     # Show the notes in the chord or scale in the title label.
     if ui.showChord:
         type = "chord"
-        notesString = "  ".join([str(n) for n in ui.chord.notes])
+        notesString = "  ".join(ui.chord.all_notes)
         #intervalsString = ", ".join(ui.chord.recipes[ui.chord.chord_type])
     else:
         type = "scale"
-        notesString = "  ".join([str(n) for n in ui.scale.notes])
+        notesString = "  ".join(ui.scale.all_notes)
         #intervalsString = ", ".join([str(i) for i in ui.scale.intervals])
 
     ui.titleLabel.setText(f"{translate(ui.rootNoteSelector.currentText())} {ui.scaleOrChordTypeSelector.currentText()} {type}: {translate(notesString)}") # {translate(intervalsString)}")
@@ -481,6 +852,27 @@ def update():
             toggle_enharmonics()
         ui.check_signature = False
 
+    show_compatible(ui)
+    reset_voicings(ui)
+    refresh_positions(ui)
+
+def show_compatible(ui):
+    """Put the chords that fit the scale, or the scales that contain the chord, in the title's tooltip.
+    Waits for the harmony table to be filled, so it's never in the way of startup."""
+    if not (ui.tooltip and harmony_table.filled):
+        return
+    if ui.showChord:
+        found = harmony_table.scales_containing(ui.chord)
+        heading = 'Scales with this chord'
+    else:
+        found = harmony_table.chords_in(ui.scale)
+        heading = 'Chords in this scale'
+    by_root = {}
+    for harmony in found:
+        by_root.setdefault(harmony.root, []).append(harmony.name.replace('_', ' '))
+    lines = [ f"{translate(root)}: {', '.join(names)}" for root, names in by_root.items() ]
+    ui.titleLabel.setToolTip(f"{heading}:\n" + "\n".join(lines))
+
 def force_resize():
     """Force the main window to resize."""
     main_window.resize(main_window.minimumSizeHint())
@@ -519,13 +911,7 @@ def tuning(string):
         new_text = str(Note(new))
     ui.tuningButtons[string].setText(new_text)
 
-    match = False
-    for row in ui.enharmonics:
-        for note in row:
-            if new_text == note:
-                match = True
-
-    if not match:
+    if new_text not in ENHARMONIC_INDEX:
         ui.statusbar.showMessage(f"Not a valid tuning, reverting to {old}", 10000)
         ui.tuningButtons[string].setText(translate(old))
     elif old != new:
@@ -537,6 +923,7 @@ def tuning(string):
 def reset_frets():
     """Reset the frets to the number specified in the model for the instrument."""
     ui.frets = ui.resetFrets
+    ui.positionSelector.setCurrentIndex(0)
     update()
     select('root') #ui.rootNoteSelector.setFocus()
 
@@ -549,10 +936,10 @@ def change_scale_or_chord():
     root = ui.rootNoteSelector.currentText()
     
     if ui.showChord:
-        ui.chord = Chord(Note(root), type)
+        ui.chord = harmony_table.chord(root, type)
         ui.statusbar.showMessage(f"{root} {type}", 10000)
     else:
-        ui.scale = Scale(Note(root), type)
+        ui.scale = harmony_table.scale(root, type)
         ui.statusbar.showMessage(f"{root} {type}", 10000)
 
     ui.update_timer.start(200)
@@ -630,9 +1017,19 @@ def help_message(show_window):
         help_dialog.show()
     select('root')
 
+def play_events(type):
+    """The events play(type) plays for the chord or scale, as (seconds, NOTE_ON or NOTE_OFF, midi note)."""
+    if ui.showChord:
+        if type == 'arpeggio':
+            return arpeggio_events(ui.chord.midi)
+        return chord_events(ui.chord.midi)
+    return arpeggio_events(ui.scale.midi)
+
 def play(type, *play_args):
     """If sound support, play chords and notes."""
     if play_sounds:
+        if not is_ready():
+            ui.statusbar.showMessage("Starting the synth, the sound follows in a moment.", 3000)
         if type=='note':
             try:
                 note = play_args[0]
@@ -640,15 +1037,48 @@ def play(type, *play_args):
             except ValueError:
                 pass
         else:
-            if ui.showChord:
-                if type == 'arpeggio':
-                    play_arpeggio(ui.chord.notes)
-                else:
-                    play_chord(ui.chord.notes)
-            else:
-                note = Note(str(ui.scale.notes[0]))
-                scale_notes = [(note + i) for i in ui.scale.intervals]
-                play_arpeggio(scale_notes)
+            play_sequence(play_events(type))
+
+def save_midi():
+    """Save what <Enter> plays, or the voicing shown, as a Standard MIDI File."""
+    harmony = ui.chord if ui.showChord else ui.scale
+    name = f"{harmony.root} {harmony.name}"
+    events = play_events('scale')
+    if ui.showChord and ui.voicingIndex >= 0:
+        voicing = ui.voicingList[ui.voicingIndex]
+        name = f"{name} voicing {ui.voicingIndex + 1}"
+        events = chord_events(list(voicing.midi))
+    filename, selected_filter = QtWidgets.QFileDialog.getSaveFileName(main_window, 'Save MIDI file', f"{name}.mid", 'MIDI files (*.mid)')
+    if not filename:
+        return
+    try:
+        write_midi(filename, [(name, events)], type=0)
+        ui.statusbar.showMessage(f"Wrote {name} to {filename}.", 10000)
+    except OSError as e:
+        ui.statusbar.showMessage(f"Could not write {filename}: {e}", 10000)
+
+def setup_timing_overlay(ui):
+    """Show the latency and jitter of the sound in a corner of the window, refreshed twice a second."""
+    ui.timingOverlay = QtWidgets.QLabel(ui.centralwidget)
+    ui.timingOverlay.setStyleSheet("background-color: rgba(0, 0, 0, 60%); color: white; padding: 4px; font-family: monospace;")
+    ui.timingOverlay.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+    ui.timingTimer = QtCore.QTimer(ui.centralwidget)
+    ui.timingTimer.timeout.connect(update_timing_overlay)
+    ui.timingTimer.start(500)
+    update_timing_overlay()
+    ui.timingOverlay.show()
+
+def update_timing_overlay():
+    """Refresh the timing overlay from timing_stats()."""
+    stats = timing_stats()
+    lines = [ f"{'ms':<9}{'p50':>7}{'p95':>7}{'p99':>7}{'n':>6}" ]
+    for name, label in (('latency', 'latency'), ('lateness', 'late'), ('jitter', 'jitter')):
+        values = [ '-' if stats[name][p] is None else f"{stats[name][p]:.1f}" for p in ('p50', 'p95', 'p99') ]
+        lines.append(f"{label:<9}" + "".join(f"{value:>7}" for value in values) + f"{stats[name]['n']:>6}")
+    ui.timingOverlay.setText("\n".join(lines))
+    ui.timingOverlay.adjustSize()
+    ui.timingOverlay.move(ui.centralwidget.width() - ui.timingOverlay.width() - 8, 8)
+    ui.timingOverlay.raise_()
 
 def toggle_enharmonics(back_to = ...):
     """Toggle between enharmonics."""
@@ -660,14 +1090,11 @@ def toggle_enharmonics(back_to = ...):
     elif root_note == 'E#':
         new_rootnote = 'F'
     else:
-        for row in ui.enharmonics:
-            if root_note in row:
-                index = row.index(root_note)
-                if index == 0:
-                    new_rootnote = row[1]
-                elif index == 1:
-                    new_rootnote = row[0]
-                break
+        enharmonic = ENHARMONIC_INDEX[root_note]
+        if root_note == enharmonic.sharp:
+            new_rootnote = enharmonic.flat
+        else:
+            new_rootnote = enharmonic.sharp
     select_root_from_label(new_rootnote)
     ui.statusbar.showMessage(f"Enharmonic: {root_note} -> {new_rootnote}", 10000)
 
@@ -700,6 +1127,13 @@ def initial_setup(ui):
     ui.check_signature = False
     ui.back_to = 'root'
 
+    setup_voicing_panel(ui)
+    reset_voicings(ui)
+    setup_position_panel(ui)
+    ui.positionKey = None
+    ui.positions = None
+    ui.fingeringPath = None
+
     ui.update_timer = QtCore.QTimer()
     ui.update_timer.setSingleShot(True)
     ui.update_timer.timeout.connect(update)    
@@ -723,6 +1157,8 @@ def initial_setup(ui):
     ui.rootNoteSelector.tuning.connect(lambda thing='tuning': select(thing))
     ui.rootNoteSelector.majmin.connect(lambda thing='majmin', back='root': toggle(thing, back))
     ui.rootNoteSelector.help.connect(lambda window=True: help_message(window))
+    ui.rootNoteSelector.voicing.connect(lambda step=1: step_voicing(step))
+    ui.rootNoteSelector.export.connect(save_midi)
     ui.rootNoteSelector.play.connect(lambda thing='scale': play(thing))
     ui.rootNoteSelector.signature.connect(lambda back_to = 'root': toggle_enharmonics(back_to=back_to))
 
@@ -735,6 +1171,8 @@ def initial_setup(ui):
     ui.circle_of_fifths.tuning.connect(lambda thing='tuning': select(thing))
     ui.circle_of_fifths.majmin.connect(lambda thing='majmin', back='circle': toggle(thing, back))
     ui.circle_of_fifths.help.connect(lambda window=True: help_message(window))
+    ui.circle_of_fifths.voicing.connect(lambda step=1: step_voicing(step))
+    ui.circle_of_fifths.export.connect(save_midi)
     ui.circle_of_fifths.play.connect(lambda thing='scale': play(thing))
     ui.circle_of_fifths.signature.connect(lambda back_to = 'circle': toggle_enharmonics(back_to=back_to))
 
@@ -747,6 +1185,8 @@ def initial_setup(ui):
     ui.scaleOrChordTypeSelector.tuning.connect(lambda thing='tuning': select(thing))
     ui.scaleOrChordTypeSelector.majmin.connect(lambda thing='majmin', back='mode': toggle(thing, back))
     ui.scaleOrChordTypeSelector.help.connect(lambda window=True: help_message(window))
+    ui.scaleOrChordTypeSelector.voicing.connect(lambda step=1: step_voicing(step))
+    ui.scaleOrChordTypeSelector.export.connect(save_midi)
     ui.scaleOrChordTypeSelector.play.connect(lambda thing='scale': play(thing))
     ui.scaleOrChordTypeSelector.signature.connect(lambda back_to = 'mode': toggle_enharmonics(back_to=back_to))
 
@@ -755,7 +1195,7 @@ def initial_setup(ui):
 
     ui.nutButton.setFocusPolicy(QtCore.Qt.ClickFocus)
 
-    ui.scale = Scale(Note('C'), 'major')
+    ui.scale = harmony_table.scale('C', 'major')
 
     for i, t in enumerate(ui.tuningButtons):
         t.returnPressed.connect(lambda string=i: tuning(string))
@@ -766,28 +1206,11 @@ def initial_setup(ui):
     ui.frets_old = ui.frets
 
     f = Fretboard(tuning=ui.tuning)
-    notes, intervals, midi = f.build(scale=ui.scale, frets=ui.frets)
-    ui.enharmonics = f.enharmonics
-
-    ui.rootNotes = ['C',
-                 'C#',
-                 'Db',
-                 'D',
-                 'D#',
-                 'Eb',
-                 'E',
-                 'E#',
-                 'F',
-                 'F#',
-                 'Gb',
-                 'G',
-                 'G#',
-                 'Ab',
-                 'A',
-                 'A#',
-                 'Bb',
-                 'B',]
+    notes, intervals, midi = f.build(harmony=ui.scale, frets=ui.frets)
 
+    ui.rootNotes = list(ALL_ROOT_NOTES)
+
+    ui.rootNoteSet = frozenset(ui.rootNotes)
     ui.rootNoteSelector.addItems(ui.rootNotes)
 
     populate_fretboard(ui, notes, intervals, midi, ui.frets)
@@ -846,16 +1269,99 @@ def setup_help_dialog(help_dialog):
     help_dialog.adjustSize()
     help_dialog.hide()
 
+def new_ui():
+    """A new Ui_MainWindow, with the attributes the fretboard needs before setupUi and initial_setup."""
+    ui = Ui_MainWindow()
+    ui.labels = []
+    ui.lines = []
+    ui.fretButtons = []
+    ui.fretMarkers = []
+    ui.pool_frets = None
+    ui.marked = {}
+    ui.canvas = None
+    ui.allScales = []
+    ui.allChords = []
+    return ui
+
+def apply_preset(ui, preset):
+    """Set strings, frets, title and markers from one of the PRESETS, and return its tuning."""
+    ui.strings = preset['strings']
+    ui.frets = preset['frets']
+    ui.resetFrets = ui.frets
+    ui.title = preset['title']
+    ui.markers = preset['markers']
+    return list(preset['tuning'])
+
 def write_settings(settings):
     """Write settings to file."""
     with open(settingsfile, 'w') as f:
         json.dump(settings, f)
 
+def harmony_inputs():
+    """What the cached scales and chords are computed from, the code in fretboard.py included."""
+    return (harmony_table.inputs(), FRETBOARD_SOURCE)
+
+def grid_inputs():
+    """What the cached fretboard grids for the current tuning are computed from."""
+    return (tuple(ui.tuning_with_octave), MAX_FRET, harmony_inputs())
+
+def load_disk_cache():
+    """Take the scales and chords and the fretboard grids for the current tuning from the disk cache, if not stale."""
+    harmonies = disk_cache.lookup('harmony table', harmony_inputs())
+    if harmonies is not None:
+        harmony_table.load(harmonies)
+    grids = disk_cache.lookup('fretboard grids', grid_inputs())
+    if grids is not None:
+        build_cache.load(grids)
+
+def fill_harmony_table():
+    """Fill in the rest of the scales and chords, and keep them in the disk cache for the next start."""
+    inputs = harmony_inputs()
+    harmony_table.fill()
+    if disk_cache.lookup('harmony table', inputs) is None:
+        disk_cache.store('harmony table', inputs, harmony_table.dump())
+        disk_cache.save()
+    show_compatible(ui)
+
+def save_disk_cache():
+    """Store the fretboard grids built for the current tuning and write the disk cache."""
+    inputs = grid_inputs()
+    grids = build_cache.dump(ui.tuning_with_octave)
+    if disk_cache.lookup('fretboard grids', inputs) != grids:
+        disk_cache.store('fretboard grids', inputs, grids)
+    disk_cache.save()
+
+def report_startup_profile(args):
+    """Called on first paint. Print the startup profile, optionally write it as JSON
+    and check it against a budget, then quit."""
+    profiler.mark('first paint')
+    print(profiler.table())
+    if args.profile_json:
+        profiler.write_json(args.profile_json)
+        print(f"Wrote startup profile to {args.profile_json}.")
+    over = []
+    if args.profile_budget:
+        over = profiler.check_budget(args.profile_budget)
+        for message in over:
+            print(f"Over budget: {message}")
+    main_window.writeSettings = False
+    app.exit(1 if over else 0)
+
 class MyMainWindow(QtWidgets.QMainWindow):
     """Extended class for the main window."""
     def __init__(self):
         super().__init__()
         self.writeSettings = True
+        self.painted = False
+
+    firstPaint = QtCore.pyqtSignal()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            # Children paint after the main window, so signal once this paint cycle is done.
+            QtCore.QTimer.singleShot(0, self.firstPaint.emit)
 
     def closeEvent(self, event):
         settings = {
@@ -871,23 +1377,27 @@ class MyMainWindow(QtWidgets.QMainWindow):
             write_settings(settings)
         else:
             print('Not writing settings to file.')
+        save_disk_cache()
 
 if __name__ == "__main__":
+    register_resources('fretboard_rc')
+    profiler.mark('register fretboard_rc')
     __location__ = os.getcwd() #os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
     settingsfile = os.path.join(__location__, SETTINGSFILENAME)
 
-    fretWidths = eighteen_rule()
+    disk_cache = DiskCache(os.path.join(__location__, CACHEFILENAME)).load()
+    # Keyed on the source too, so that editing eighteen_rule() computes the widths again.
+    fretWidths = disk_cache.get('fret widths', (eighteen_rule.__defaults__, function_source(eighteen_rule)), eighteen_rule)
+    profiler.mark('disk cache load')
 
     app = QtWidgets.QApplication(sys.argv)
     main_window = MyMainWindow()
+    profiler.mark('QApplication')
 
     help_dialog = QtWidgets.QDialog()
     setup_help_dialog(help_dialog)
-    ui = Ui_MainWindow()
-    ui.labels = []
-    ui.enharmonics = []
-    ui.allScales = []
-    ui.allChords = []
+    profiler.mark('help dialog')
+    ui = new_ui()
 
     # First load settings from file if available
     try:
@@ -936,13 +1446,14 @@ if __name__ == "__main__":
         }
         ui.resetFrets = ui.frets
 
+    profiler.mark('settings load')
+
     # Set up and parse CLI arguments
     all_scales = [ s for s in Scale.scales.keys() ]
     all_chords = [ c for c in Chord.valid_types ]
-    root_notes = ['C','C#','Db','D','D#','Eb','E','F','F#','Gb','G','G#','Ab','A','A#','Bb','B',]
     parser = argparse.ArgumentParser(description=f"Select rootnote and type for the scale or chord, as well as other parameters as listed below. The available scales are {all_scales} and the available chords are {all_chords}.")
     parser.add_argument('-r', '--rootnote',
-                        choices=root_notes,
+                        choices=ROOT_NOTES,
                         default='C',
                         help="The root note of the scale or chord.")
     parser.add_argument('-t', '--type',
@@ -953,64 +1464,37 @@ if __name__ == "__main__":
                         choices=range(1,25))
     parser.add_argument('-tf', '--tofret', type=int, help="The last fret of the fret interval.",
                         choices=range(1,25))
-    parser.add_argument('-p', '--preset', choices=['ukulele', 'guitar', '7-string', 'banjo'], help="Presets for type of instrument. Edit the fretboard_settings.json for more options.")
+    parser.add_argument('-p', '--preset', choices=list(PRESETS.keys()), help="Presets for type of instrument. Edit the fretboard_settings.json for more options.")
     parser.add_argument('--notooltip', action='store_true', help="Turns off tooltips.")
+    parser.add_argument('--painted', action='store_true', help="Draw the fretboard as one custom-painted widget instead of labels.")
+    parser.add_argument('--timing', action='store_true', help="Show the latency and jitter of the sound in a corner of the window.")
+    parser.add_argument('--note-cache', type=int, default=32, metavar='MB', help="Memory for notes rendered ahead, so that clicking a note sounds at once. 0 turns it off.")
+    parser.add_argument('--profile-startup', action='store_true', help="Print the time spent in each startup phase, then quit.")
+    parser.add_argument('--profile-json', metavar='FILE', help="With --profile-startup, also write the startup profile as JSON.")
+    parser.add_argument('--profile-budget', metavar='FILE', help="With --profile-startup, exit with an error if a phase is over its budget, given as JSON {\"phase\": ms}.")
     parser.parse_args()
 
     args = parser.parse_args()
 
     if args.preset:
-        if args.preset == 'ukulele':
-            loaded_tuning_with_octave = ['G4', 'C4', 'E4', 'A4']
-            ui.strings = 4
-            ui.frets = (0,17)
-            ui.resetFrets = ui.frets
-            ui.title = "Ukulele"
-            ui.markers = {
-                'single':   [3, 5, 7, 10, 15, 17, 19],
-                'double':   [12]
-            }
-        elif args.preset == 'guitar':
-            loaded_tuning_with_octave = ['B1', 'E2', 'A2', 'D3', 'G3', 'B3', 'E4']
-            loaded_tuning_with_octave = loaded_tuning_with_octave[1:]
-            ui.strings = 6
-            ui.frets = (0,24)
-            ui.resetFrets = ui.frets
-            ui.title = "6-string guitar"
-            ui.markers = {
-                'single':   [3, 5, 7, 9, 15, 17, 19, 21],
-                'double':   [12]
-            }
-        elif args.preset == '7-string':
-            loaded_tuning_with_octave = ['B1', 'E2', 'A2', 'D3', 'G3', 'B3', 'E4']
-            ui.strings = 7
-            ui.frets = (0,24)
-            ui.resetFrets = ui.frets
-            ui.title = "7-string guitar"
-            ui.markers = {
-                'single':   [3, 5, 7, 9, 15, 17, 19, 21],
-                'double':   [12]
-            }
-        elif args.preset == 'banjo':
-            loaded_tuning_with_octave = ['G4', 'D3', 'G3', 'B3', 'D4']
-            ui.strings = 5
-            ui.frets = (0,24)
-            ui.resetFrets = ui.frets
-            ui.title = "Banjo"
-            ui.markers = {
-                'single':   [3, 5, 7, 10, 15, 17, 19, 22],
-                'double':   [12]
-            }
+        loaded_tuning_with_octave = apply_preset(ui, PRESETS[args.preset])
 
     tune_with_octave(loaded_tuning_with_octave)
+    profiler.mark('argparse')
+    load_disk_cache()
+    profiler.mark('disk cache lookup')
 
     ui.tooltip = not args.notooltip
+    ui.painted = args.painted
+    ui.prefetched = []
 
     # Initial setup of the UI
     ui.setupUi(main_window, ui.tooltip, strings=ui.strings)
     main_window.setWindowIcon(QtGui.QIcon(":/icons/guitar.png"))
     main_window.setWindowTitle(ui.title)
+    profiler.mark('setupUi')
     success = initial_setup(ui)
+    profiler.mark('initial_setup')
 
     # Set frets from CLI if available
     if ( not args.preset ):
@@ -1023,11 +1507,11 @@ if __name__ == "__main__":
     type_of_scale_or_chord = args.type
 
     if type_of_scale_or_chord in ui.allScales:
-        ui.scale = Scale(Note(root), type_of_scale_or_chord)
+        ui.scale = harmony_table.scale(root, type_of_scale_or_chord)
         ui.rootNoteSelector.setCurrentText(root)
         ui.scaleOrChordTypeSelector.setCurrentText(type_of_scale_or_chord)
     else:
-        ui.chord = Chord(Note(root), type_of_scale_or_chord)
+        ui.chord = harmony_table.chord(root, type_of_scale_or_chord)
         ui.showChord = True
         ui.scaleOrChordSlider.setValue(1)
         ui.scaleOrChordTypeSelector.clear()
@@ -1036,9 +1520,22 @@ if __name__ == "__main__":
         ui.scaleOrChordTypeSelector.setCurrentText(type_of_scale_or_chord)
 
     update()
+    profiler.mark('first update')
+    if args.timing and play_sounds:
+        setup_timing_overlay(ui)
 
     if success:
+        if args.profile_startup or args.profile_json or args.profile_budget:
+            main_window.firstPaint.connect(lambda args=args: report_startup_profile(args))
         main_window.show()
+        profiler.mark('show')
+        # Fill in the rest of the scales and chords once the window is up.
+        QtCore.QTimer.singleShot(0, fill_harmony_table)
+        if play_sounds:
+            # Set up the synth after the window is up, so it's not in the way of the first paint.
+            QtCore.QTimer.singleShot(0, init_audio_in_background)
+            if args.note_cache > 0:
+                QtCore.QTimer.singleShot(0, lambda: start_note_cache(args.note_cache * 1024 * 1024).prefetch(ui.prefetched))
         sys.exit(app.exec_())
     else:
         sys.exit()
@@ -0,0 +1,100 @@
+import io
+import sys
+import csv
+import json
+import argparse
+from musthe import Scale, Chord
+from fretboard import Fretboard, harmony_table, ROOT_NOTES, PRESETS
+
+# No PyQt5 here: this is for scripts and batch jobs that only want the diagrams.
+
+FORMATS = ('json', 'csv', 'ascii')
+
+def harmony_of(root, type):
+    """The Harmony for root and type, which is a scale type or a chord type."""
+    if type in Scale.scales:
+        return harmony_table.scale(root, type)
+    return harmony_table.chord(root, type)
+
+def diagram(root, type, tuning, frets):
+    """Build the fretboard for root and type on tuning (lowest string first) and frets=(<fromfret>, <tofret>)."""
+    f = Fretboard(tuning=list(tuning))
+    f.build(harmony=harmony_of(root, type), frets=frets)
+    return f
+
+def as_json(f):
+    """The notes, intervals and midi grids of a built Fretboard as JSON. Rows are top-down, highest string first."""
+    return json.dumps({
+        'root':         f.harmony.root,
+        'type':         f.harmony.name,
+        'kind':         f.harmony.kind,
+        'notes':        list(f.harmony.all_notes),
+        'strings':      list(f.tuning_with_octaves),
+        'frets':        list(range(f.frets[0], f.frets[1]+1)),
+        'notes_grid':       f.notes_grid,
+        'intervals_grid':   f.intervals_grid,
+        'midi_grid':        f.midi_grid,
+    }, ensure_ascii=False) + "\n"
+
+def as_csv(f):
+    """One CSV row per string and fret of a built Fretboard, with its note, interval and midi note.
+    Strings are counted from 1, highest first, and note and interval are empty outside the scale or chord."""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(['string', 'tuning', 'fret', 'note', 'interval', 'midi'])
+    for string, (name, notes, intervals, midi) in enumerate(zip(f.tuning_with_octaves, f.notes_grid, f.intervals_grid, f.midi_grid), start=1):
+        for fret, note, interval, m in zip(range(f.frets[0], f.frets[1]+1), notes, intervals, midi):
+            writer.writerow([string, name, fret, note, interval, m])
+    return out.getvalue()
+
+def as_ascii(f):
+    """The plain text fretboard, as Fretboard.printPlain() prints it."""
+    return f.plain()
+
+FORMATTERS = {
+    'json':     as_json,
+    'csv':      as_csv,
+    'ascii':    as_ascii,
+}
+
+def instrument(preset, fromfret=None, tofret=None):
+    """Tuning and fret window for a preset, with the fret window narrowed if both fromfret and tofret are given."""
+    preset = PRESETS[preset]
+    frets = preset['frets']
+    if fromfret and tofret:
+        frets = tuple(sorted((fromfret, tofret)))
+    return list(preset['tuning']), frets
+
+def make_parser():
+    all_scales = [ s for s in Scale.scales.keys() ]
+    all_chords = [ c for c in Chord.valid_types ]
+    parser = argparse.ArgumentParser(description=f"Print the fretboard for a scale or chord as JSON, CSV or plain text, without the GUI. The available scales are {all_scales} and the available chords are {all_chords}.")
+    parser.add_argument('-r', '--rootnote',
+                        choices=ROOT_NOTES,
+                        default='C',
+                        help="The root note of the scale or chord.")
+    parser.add_argument('-t', '--type',
+                        choices=all_scales+all_chords,
+                        default='major',
+                        help="The type of scale or chord.")
+    parser.add_argument('-ff', '--fromfret', type=int, help="The first fret of the fret interval.",
+                        choices=range(1,25))
+    parser.add_argument('-tf', '--tofret', type=int, help="The last fret of the fret interval.",
+                        choices=range(1,25))
+    parser.add_argument('-p', '--preset', choices=list(PRESETS.keys()), default='guitar', help="Presets for type of instrument.")
+    parser.add_argument('-f', '--format', choices=FORMATS, default='json', help="Output format.")
+    parser.add_argument('-o', '--output', metavar='FILE', help="Write to FILE instead of standard output.")
+    return parser
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    tuning, frets = instrument(args.preset, args.fromfret, args.tofret)
+    text = FORMATTERS[args.format](diagram(args.rootnote, args.type, tuning, frets))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import os
+import sys
+import struct
+import importlib
+from resources import BUNDLES, __location__
+
+def rcc_bytes(module):
+    """Binary .rcc bundle (format version 2) from the data in a pyrcc5 generated module."""
+    data = module.qt_resource_data
+    names = module.qt_resource_name
+    tree = module.qt_resource_struct_v2
+    header_size = 20
+    data_offset = header_size
+    names_offset = data_offset + len(data)
+    tree_offset = names_offset + len(names)
+    header = b'qres' + struct.pack('>IIII', 2, tree_offset, data_offset, names_offset)
+    return header + data + names + tree
+
+def make_rcc(module_name):
+    """Write the .rcc bundle for a pyrcc5 generated module next to it."""
+    module = importlib.import_module(module_name)
+    rccfile = os.path.join(__location__, BUNDLES[module_name])
+    with open(rccfile, 'wb') as f:
+        f.write(rcc_bytes(module))
+    print(f"Wrote {rccfile}")
+
+if __name__ == "__main__":
+    # Usage: python make_rcc.py [module ...], defaults to all the resource modules.
+    for module_name in sys.argv[1:] or BUNDLES.keys():
+        make_rcc(module_name)
@@ -0,0 +1,120 @@
+import struct
+
+# The note events that play_sounds plays, and Standard MIDI Files of them. No sound or Qt needed here.
+
+NOTE_ON = 'on'
+NOTE_OFF = 'off'
+VELOCITY = 100
+
+def arpeggio_events(midi_notes, step=0.3):
+    """Events for playing the notes one after the other."""
+    events = []
+    for i, n in enumerate(midi_notes):
+        events.append((i*step, NOTE_ON, n))
+        events.append(((i+1)*step, NOTE_OFF, n))
+    return events
+
+def chord_events(midi_notes, duration=0.5):
+    """Events for playing the notes together."""
+    return [ (0, NOTE_ON, n) for n in midi_notes ] + [ (duration, NOTE_OFF, n) for n in midi_notes ]
+
+def midi_notes_of(notes):
+    """Midi note numbers for musthe Notes, or midi note numbers already."""
+    return [ n if isinstance(n, int) else n.midi_note() for n in notes ]
+
+def in_time_order(events):
+    """The events sorted by time, note offs first when at the same time, so a repeated note starts again."""
+    return sorted(events, key=lambda event: (event[0], event[1] != NOTE_OFF))
+
+TICKS_PER_BEAT = 480
+TEMPO = 500000      # Microseconds per beat, 120 bpm
+
+def variable_length(value):
+    """A number as a MIDI variable-length quantity."""
+    data = bytearray([value & 0x7f])
+    value = value >> 7
+    while value:
+        data.insert(0, 0x80 | (value & 0x7f))
+        value = value >> 7
+    return bytes(data)
+
+class MidiFileWriter():
+    """Writes a Standard MIDI File to a seekable binary file one event at a time, without keeping the events.
+    Type 0 has a single track, type 1 any number of tracks, played together. Chunk lengths are filled in
+    when each track ends, and the number of tracks on close()."""
+    def __init__(self, f, type=0, ticks_per_beat=TICKS_PER_BEAT, tempo=TEMPO):
+        if type not in (0, 1):
+            raise ValueError(f"Standard MIDI Files are type 0 or 1 here, not {type}.")
+        self.f = f
+        self.type = type
+        self.ticks_per_beat = ticks_per_beat
+        self.tempo = tempo
+        self.tracks = 0
+        self.track_start = None
+        self.f.write(struct.pack('>4sIHHH', b'MThd', 6, type, 0, ticks_per_beat))
+
+    def start_track(self, name=None, channel=0):
+        """Start the next track, on channel. The tempo goes in the first track."""
+        if self.track_start is not None:
+            self.end_track()
+        if self.type == 0 and self.tracks == 1:
+            raise ValueError("A type 0 MIDI file has only one track.")
+        self.f.write(struct.pack('>4sI', b'MTrk', 0))
+        self.track_start = self.f.tell()
+        self.channel = channel
+        self.ticks = 0
+        if self.tracks == 0:
+            self.meta(0x51, self.tempo.to_bytes(3, 'big'))
+        if name:
+            self.meta(0x03, name.encode('utf-8'))
+        self.tracks = self.tracks + 1
+
+    def meta(self, kind, data, ticks=None):
+        self.write_event(ticks, bytes([0xff, kind]) + variable_length(len(data)) + data)
+
+    def write_event(self, ticks, data):
+        delta = 0 if ticks is None else ticks - self.ticks
+        if delta < 0:
+            raise ValueError("MIDI events have to be written in time order.")
+        self.ticks = self.ticks + delta
+        self.f.write(variable_length(delta) + data)
+
+    def event(self, seconds, kind, note, velocity=VELOCITY):
+        """Write a NOTE_ON or NOTE_OFF event at seconds from the start of the track."""
+        ticks = round(seconds * 1000000 / self.tempo * self.ticks_per_beat)
+        status = (0x90 if kind == NOTE_ON else 0x80) | self.channel
+        self.write_event(ticks, bytes([status, note, velocity if kind == NOTE_ON else 0]))
+
+    def events(self, events):
+        """Write (seconds, NOTE_ON or NOTE_OFF, midi note) events, which may come from a generator, in time order."""
+        for seconds, kind, note in events:
+            self.event(seconds, kind, note)
+
+    def end_track(self):
+        """End the track and fill in its length."""
+        self.meta(0x2f, b'')
+        end = self.f.tell()
+        self.f.seek(self.track_start - 4)
+        self.f.write(struct.pack('>I', end - self.track_start))
+        self.f.seek(end)
+        self.track_start = None
+
+    def close(self):
+        """End the last track and fill in the number of tracks. Doesn't close the file."""
+        if self.track_start is not None:
+            self.end_track()
+        end = self.f.tell()
+        self.f.seek(10)
+        self.f.write(struct.pack('>H', self.tracks))
+        self.f.seek(end)
+
+def write_midi(filename, tracks, type):
+    """Write (track name, events) pairs as a Standard MIDI File of type 0 (one track) or 1, streaming them:
+    tracks and their events may come from generators. Events have to be in time order, as arpeggio_events()
+    and chord_events() make them."""
+    with open(filename, 'wb') as f:
+        writer = MidiFileWriter(f, type=type)
+        for name, events in tracks:
+            writer.start_track(name)
+            writer.events(events)
+        writer.close()
@@ -1,12 +1,13 @@
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtCore import *
+from bisect import bisect_right
 
 class QComboBoxWithKeyEvents(QtWidgets.QComboBox):
 
     def __init__(self, parent):
         super().__init__(parent)
 
-    notesOrIntervals, chordOrScale, nut, root, circle, mode, tuning, majmin, help, play, signature = [ pyqtSignal() for i in range(11) ]
+    notesOrIntervals, chordOrScale, nut, root, circle, mode, tuning, majmin, help, play, signature, voicing, export = [ pyqtSignal() for i in range(13) ]
 
     def focusInEvent(self, event):
         self.set_glow_effect(True)
@@ -49,16 +50,29 @@ class QComboBoxWithKeyEvents(QtWidgets.QComboBox):
             self.play.emit()
         elif event.key() == QtCore.Qt.Key_S:
             self.signature.emit()            
+        elif event.key() == QtCore.Qt.Key_V:
+            self.voicing.emit()
+        elif event.key() == QtCore.Qt.Key_E:
+            self.export.emit()
         else:
             super(QComboBoxWithKeyEvents, self).keyPressEvent(event)
 
+class QComboBoxFilledOnShow(QtWidgets.QComboBox):
+    """Combo box that signals before its popup shows, so that its items can be made only when needed."""
+
+    aboutToShowPopup = pyqtSignal()
+
+    def showPopup(self):
+        self.aboutToShowPopup.emit()
+        super().showPopup()
+
 class QDialWithKeyEvents(QtWidgets.QDial):
 
     def __init__(self, parent):
         super().__init__(parent)
         self.user_interaction = False
 
-    notesOrIntervals, chordOrScale, nut, root, mode, tuning, majmin, help, play, signature = [ pyqtSignal() for i in range(10) ]
+    notesOrIntervals, chordOrScale, nut, root, mode, tuning, majmin, help, play, signature, voicing, export = [ pyqtSignal() for i in range(12) ]
 
     def focusInEvent(self, event):
         self.set_glow_effect(True)
@@ -107,6 +121,10 @@ class QDialWithKeyEvents(QtWidgets.QDial):
             self.play.emit()
         elif event.key() == QtCore.Qt.Key_S:
             self.signature.emit()
+        elif event.key() == QtCore.Qt.Key_V:
+            self.voicing.emit()
+        elif event.key() == QtCore.Qt.Key_E:
+            self.export.emit()
         else:
             super(QDialWithKeyEvents, self).keyPressEvent(event)
 
@@ -195,4 +213,149 @@ class QPushButtonRightClick(QtWidgets.QPushButton):
         if e.button() == Qt.RightButton:
             self.rightClicked.emit()
         else:
-            return super().mousePressEvent(e)
\ No newline at end of file
+            return super().mousePressEvent(e)
+
+class QFretboardCanvas(QtWidgets.QWidget):
+    """The whole neck painted in one widget: fret lines, notes, fret numbers and markers.
+    Clicks are hit-tested to a (string, column) cell, or a fret number."""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.cells = []         # Rows of (text, background QColor, text QColor), or None for an empty cell.
+        self.widths = []        # Width of each column.
+        self.frets = []         # Fret number of each column.
+        self.markers = {}       # Column -> marker text.
+        self.transparent = set()
+        self.highlighted = None
+        self.highlight_color = QtGui.QColor('lightBlue')
+        self.row_height = 40
+        self.spacing = 6
+        self.line_width = 5
+        self.marker_height = 20
+        self.starts = []
+        font = QtGui.QFont()
+        font.setPointSize(12)
+        self.setFont(font)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
+
+    clicked, selected, ctrl_clicked = [ pyqtSignal(int, int) for i in range(3) ]
+    fretClicked = pyqtSignal(int)
+
+    def set_board(self, cells, widths, frets, markers):
+        """Set new cells, column widths, fret numbers and markers, and repaint."""
+        self.cells = cells
+        self.widths = widths
+        self.frets = frets
+        self.markers = markers
+        self.transparent = set()
+        self.highlighted = None
+        self.starts = []
+        x = self.line_width
+        for width in widths:
+            self.starts.append(x)
+            x = x + width + self.line_width
+        self.updateGeometry()
+        self.update()
+
+    def toggle_transparency(self, row, column):
+        """Toggle the transparency of one note."""
+        self.transparent ^= {(row, column)}
+        self.update()
+
+    def highlight_column(self, column):
+        """Highlight a column, e.g. the first fret selected for zooming."""
+        self.highlighted = column
+        self.update()
+
+    def pitch(self):
+        return self.row_height + self.spacing
+
+    def sizeHint(self):
+        width = self.line_width + sum(w + self.line_width for w in self.widths)
+        height = (len(self.cells) + 1) * self.pitch() + self.marker_height
+        return QtCore.QSize(width, height)
+
+    def minimumSizeHint(self):
+        return self.sizeHint()
+
+    def cell_rect(self, row, column):
+        return QtCore.QRect(self.starts[column], row * self.pitch(), self.widths[column], self.row_height)
+
+    def cell_at(self, pos):
+        """Return (row, column) under pos, row == len(self.cells) is the fret number row. None if outside."""
+        if not self.starts or pos.x() < 0:
+            return None
+        column = max(bisect_right(self.starts, pos.x()) - 1, 0)
+        if pos.x() > self.starts[column] + self.widths[column] + self.line_width:
+            return None
+        row = pos.y() // self.pitch()
+        if row > len(self.cells) or pos.y() % self.pitch() >= self.row_height:
+            return None
+        return row, column
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        strings = len(self.cells)
+        neck_height = strings * self.pitch() - self.spacing
+
+        # Strings and fret lines.
+        painter.setPen(QtGui.QPen(QtGui.QColor('gray'), 1))
+        right = self.line_width + sum(w + self.line_width for w in self.widths)
+        for row in range(strings):
+            y = row * self.pitch() + self.row_height // 2
+            painter.drawLine(0, y, right, y)
+        for x in self.starts + [right]:
+            painter.fillRect(x - self.line_width, 0, self.line_width - 2, neck_height, self.palette().dark())
+
+        if self.highlighted is not None and self.highlighted < len(self.widths):
+            for row in range(strings):
+                painter.fillRect(self.cell_rect(row, self.highlighted), self.highlight_color)
+
+        # The notes, as circles in the interval colors.
+        painter.setPen(QtGui.QPen(QtCore.Qt.black, 3))
+        for row, cells in enumerate(self.cells):
+            for column, cell in enumerate(cells):
+                if cell is None:
+                    continue
+                text, background, foreground = cell
+                rect = self.cell_rect(row, column)
+                diameter = min(rect.width(), rect.height()) - 4
+                circle = QtCore.QRect(0, 0, diameter, diameter)
+                circle.moveCenter(rect.center())
+                painter.setOpacity(0.3 if (row, column) in self.transparent else 1.0)
+                painter.setPen(QtGui.QPen(QtCore.Qt.black, 3))
+                painter.setBrush(background)
+                painter.drawEllipse(circle)
+                painter.setPen(foreground)
+                painter.drawText(rect, QtCore.Qt.AlignCenter, text)
+        painter.setOpacity(1.0)
+
+        # Fret numbers, drawn as buttons, and the markers below them.
+        for column, fret in enumerate(self.frets):
+            option = QtWidgets.QStyleOptionButton()
+            option.initFrom(self)
+            option.rect = self.cell_rect(strings, column)
+            option.text = str(fret)
+            self.style().drawControl(QtWidgets.QStyle.CE_PushButton, option, painter, self)
+        painter.setPen(self.palette().windowText().color())
+        for column, marker in self.markers.items():
+            rect = QtCore.QRect(self.starts[column], (strings + 1) * self.pitch(), self.widths[column], self.marker_height)
+            painter.drawText(rect, QtCore.Qt.AlignCenter, marker)
+        painter.end()
+
+    def mousePressEvent(self, ev):
+        cell = self.cell_at(ev.pos())
+        if cell is None:
+            return
+        row, column = cell
+        if row == len(self.cells):
+            if ev.button() == Qt.LeftButton:
+                self.fretClicked.emit(self.frets[column])
+            return
+        modifiers = QtGui.QGuiApplication.keyboardModifiers()
+        if modifiers & QtCore.Qt.ControlModifier:
+            self.ctrl_clicked.emit(row, column)
+        elif ev.button() == Qt.RightButton:
+            self.selected.emit(row, column)
+        else:
+            self.clicked.emit(row, column)
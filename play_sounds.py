@@ -1,42 +1,511 @@
 import time
 import os
+import heapq
+import struct
+import threading
+import importlib.util
+from array import array
+from operator import add, mul
+from collections import OrderedDict, deque
 import tinysoundfont
 from musthe import Note, Chord, Scale
-from PyQt5.QtCore import QFile
-import play_sounds_resources
+from PyQt5.QtCore import QFile, QIODevice
+from resources import register_resources
+from midi_file import NOTE_ON, VELOCITY, arpeggio_events, chord_events, midi_notes_of, in_time_order
+
+# Playing live needs pyaudio, rendering to WAV files only needs tinysoundfont.
+live_audio = importlib.util.find_spec('pyaudio') is not None
 
 synthfilename = "florestan-piano.sf2"
+synthresource = ":/resources/florestan-piano.sf2"
 __location__ = os.getcwd() #os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
 synthfile = os.path.join(__location__, synthfilename)
 
-if not os.path.isfile(synthfile):
-    print("Exporting synth file")
-    QFile.copy(":/resources/florestan-piano.sf2", synthfile)
+def load_soundfont(synth):
+    """Load the SoundFont straight from the Qt resource bytes, without writing it to disk.
+    Falls back to loading synthfile from disk."""
+    register_resources('play_sounds_resources')
+    resource = QFile(synthresource)
+    if resource.open(QIODevice.ReadOnly):
+        data = bytes(resource.readAll())
+        resource.close()
+        try:
+            return synth.sfload(data)
+        except RuntimeError:
+            print("Could not load the synth from resources, trying file.")
+    return synth.sfload(synthfile)
+
+SAMPLERATE = 44100
+CHANNELS = 2
+FRAME_BYTES = CHANNELS * 4     # Stereo float32
+TAIL = 1.0                     # Seconds after the last offline render's last event, to let the notes die away
+CALL = 'call'                  # Scheduler event that calls a function instead of playing a note
+RING = 1.0                     # Seconds a struck note is held before it's released and its tail dies away
+POLYPHONY = 8                  # Struck notes sounding at once, before the oldest is released to make room
+FADE_FRAMES = 256              # A stolen pre-rendered note fades out over this many frames instead of clicking
+
+class Timing():
+    """Latency and jitter of what was played, from timestamps taken as it plays. Keeps the last size of each, in seconds."""
+    def __init__(self, size=1000):
+        self.latency = deque(maxlen=size)       # From the play call to its first note on
+        self.lateness = deque(maxlen=size)      # Of each note on or off, after its deadline
+        self.jitter = deque(maxlen=size)        # Time between onsets, off from the time asked for
+        self.lock = threading.Lock()
+        self.received = None                    # When the play call now playing came in
+        self.onset = None                       # (deadline, time) of its last note on
+
+    def scheduled(self, received):
+        """A play call that came in at received has been scheduled."""
+        with self.lock:
+            self.received = received
+            self.onset = None
+
+    def issued(self, deadline, kind, now):
+        """A NOTE_ON or NOTE_OFF due at deadline went to the synth at now."""
+        with self.lock:
+            self.lateness.append(now - deadline)
+            if kind != NOTE_ON:
+                return
+            if self.received is not None:
+                self.latency.append(now - self.received)
+                self.received = None
+            # Notes of a chord start together; only the first one counts as an onset.
+            if self.onset is None or deadline > self.onset[0]:
+                if self.onset is not None:
+                    self.jitter.append(abs((now - self.onset[1]) - (deadline - self.onset[0])))
+                self.onset = (deadline, now)
+
+    def started(self, received, now):
+        """A struck note asked for at received started playing at now."""
+        with self.lock:
+            self.latency.append(now - received)
+
+    def stats(self):
+        """{'latency': ..., 'lateness': ..., 'jitter': ...}, each {'n', 'p50', 'p95', 'p99', 'max'} in milliseconds."""
+        with self.lock:
+            samples = { 'latency': sorted(self.latency), 'lateness': sorted(self.lateness), 'jitter': sorted(self.jitter) }
+        stats = {}
+        for name, ordered in samples.items():
+            def pick(p):
+                return round(ordered[min(len(ordered)-1, int(p/100 * len(ordered)))] * 1000, 3) if ordered else None
+            stats[name] = { 'n': len(ordered), 'p50': pick(50), 'p95': pick(95), 'p99': pick(99), 'max': pick(100) }
+        return stats
+
+timing = Timing()
+
+class Scheduler():
+    """Plays timed note on/off events on its own thread, so the caller never waits."""
+    def __init__(self, synth, channel=0):
+        self.synth = synth
+        self.channel = channel
+        self.events = []        # Heap of (deadline, sequence number, kind, note), with a function for note if kind is CALL
+        self.sequence = 0
+        self.sounding = set()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='play_sounds scheduler', daemon=True)
+        self.thread.start()
+
+    def play(self, events, replace=True, received=None):
+        """Schedule [(seconds from now, NOTE_ON or NOTE_OFF, midi note), ...] and return at once.
+        With replace=True, whatever is playing is stopped first, instead of queueing behind it.
+        received is when the call to play came in, for the latency stats."""
+        start = time.perf_counter()
+        with self.condition:
+            if replace:
+                self._cancel()
+            timing.scheduled(start if received is None else received)
+            for offset, kind, note in events:
+                heapq.heappush(self.events, (start + offset, self.sequence, kind, note))
+                self.sequence = self.sequence + 1
+            self.condition.notify()
+
+    def call_later(self, seconds, function, *args):
+        """Call function(*args) on the scheduler thread after seconds. Not dropped by cancel()."""
+        with self.condition:
+            heapq.heappush(self.events, (time.perf_counter() + seconds, self.sequence, CALL, lambda: function(*args)))
+            self.sequence = self.sequence + 1
+            self.condition.notify()
+
+    def cancel(self):
+        """Drop all pending note events and silence the notes still sounding."""
+        with self.condition:
+            self._cancel()
+            self.condition.notify()
+
+    def _cancel(self):
+        self.events = [ event for event in self.events if event[2] == CALL ]
+        heapq.heapify(self.events)
+        for note in self.sounding:
+            self.synth.noteoff(self.channel, note)
+        self.sounding = set()
+
+    def _notes_pending(self):
+        return any(event[2] != CALL for event in self.events)
+
+    def busy(self):
+        """True while note events are pending."""
+        with self.condition:
+            return self._notes_pending()
+
+    def wait(self, timeout=None):
+        """Block until all pending note events have been played. Functions from call_later(), such as the
+        releases of struck notes, are not waited for. Not for the GUI thread."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self.condition:
+            while self._notes_pending():
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def run(self):
+        with self.condition:
+            while True:
+                if not self.events:
+                    self.condition.wait()
+                    continue
+                # Sleep until the absolute deadline of the next event, so timing errors don't add up.
+                delay = self.events[0][0] - time.perf_counter()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+                deadline, sequence, kind, note = heapq.heappop(self.events)
+                if kind == CALL:
+                    note()
+                elif kind == NOTE_ON:
+                    self.synth.noteon(self.channel, note, VELOCITY)
+                    self.sounding.add(note)
+                    timing.issued(deadline, kind, time.perf_counter())
+                else:
+                    self.synth.noteoff(self.channel, note)
+                    self.sounding.discard(note)
+                    timing.issued(deadline, kind, time.perf_counter())
+                if not self._notes_pending():
+                    self.condition.notify_all()
+
+class MixingSynth(tinysoundfont.Synth):
+    """A synth that also mixes pre-rendered buffers into what it plays, e.g. notes from the NoteCache."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.voices = []        # [samples, position, when asked for, end, fade start] for each buffer still playing
+        self.voices_lock = threading.Lock()
+
+    def mix(self, samples, received=None):
+        """Start playing samples, an array of stereo floats, on top of everything else.
+        received is when they were asked for, for the latency stats."""
+        voice = [samples, 0, time.perf_counter() if received is None else received, len(samples), None]
+        with self.voices_lock:
+            self.voices.append(voice)
+        return voice
+
+    def fade(self, voice):
+        """Fade out a voice started by mix() over FADE_FRAMES, instead of letting it play to the end."""
+        with self.voices_lock:
+            if voice[4] is None:
+                voice[4] = voice[1]
+                voice[3] = min(voice[3], voice[1] + len(FADE_OUT))
+
+    def generate(self, samples, buffer=None):
+        buffer = super().generate(samples, buffer)
+        with self.voices_lock:
+            if not self.voices:
+                return buffer
+            out = array('f')
+            out.frombytes(buffer)
+            for voice in self.voices:
+                if voice[1] == 0:
+                    timing.started(voice[2], time.perf_counter())
+                part = voice[0][voice[1]:min(voice[1] + len(out), voice[3])]
+                if voice[4] is not None:
+                    offset = voice[1] - voice[4]
+                    part = array('f', map(mul, part, FADE_OUT[offset:offset + len(part)]))
+                out[:len(part)] = array('f', map(add, out[:len(part)], part))
+                voice[1] = voice[1] + len(part)
+            self.voices = [ voice for voice in self.voices if voice[1] < voice[3] ]
+        buffer[:] = out.tobytes()
+        return buffer
+
+FADE_OUT = array('f', ( 1 - (i // CHANNELS) / FADE_FRAMES for i in range(FADE_FRAMES * CHANNELS) ))
+
+class VoiceManager():
+    """Struck notes that ring for RING seconds and overlap, up to polyphony at a time. Striking one more
+    releases the oldest first. Releases happen on the scheduler thread, so striking a note never waits.
+    Notes come from the note cache when it has them, mixed in, and from the synth otherwise."""
+    def __init__(self, synth, scheduler, polyphony=POLYPHONY, ring=RING):
+        self.synth = synth
+        self.scheduler = scheduler
+        self.polyphony = polyphony
+        self.ring = ring
+        self.voices = OrderedDict()     # Voice number -> (midi note, voice from synth.mix() or None), oldest first
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def strike(self, note, samples=None, received=None):
+        """Start note now, from samples rendered with ring seconds held if given, and release it after ring seconds."""
+        now = time.perf_counter()
+        with self.lock:
+            while len(self.voices) >= self.polyphony:
+                self._release(next(iter(self.voices)), steal=True)
+            if samples is None:
+                self.synth.noteon(0, note, VELOCITY)
+                timing.started(now if received is None else received, now)
+                mixed = None
+            else:
+                mixed = self.synth.mix(samples, received)
+            voice = self.count
+            self.count = self.count + 1
+            self.voices[voice] = (note, mixed)
+        self.scheduler.call_later(self.ring, self.release, voice)
+
+    def release(self, voice):
+        """Let a voice go, unless it has already been stolen."""
+        with self.lock:
+            self._release(voice)
+
+    def _release(self, voice, steal=False):
+        if voice not in self.voices:
+            return
+        note, mixed = self.voices.pop(voice)
+        if mixed is None:
+            # Releases the oldest strike of the note, which is this one, as all ring equally long.
+            self.synth.noteoff(0, note)
+        elif steal:
+            self.synth.fade(mixed)
+        # Otherwise the rendered note lets go after ring seconds by itself.
+
+    def sounding(self):
+        """How many struck notes are still held."""
+        with self.lock:
+            return len(self.voices)
 
-synth = tinysoundfont.Synth()
-sfid = synth.sfload(synthfile)
-synth.program_select(0, sfid, 0, 0)
-synth.start()
+NOTE_CACHE_BYTES = 32 * 1024 * 1024
+
+class NoteCache():
+    """Single notes rendered ahead on a background thread, so playing one doesn't wait on the synth.
+    The least recently played notes are dropped when the buffers take more than max_bytes."""
+    def __init__(self, samplerate=SAMPLERATE, max_bytes=NOTE_CACHE_BYTES):
+        self.samplerate = samplerate
+        self.max_bytes = max_bytes
+        self.buffers = OrderedDict()    # midi note -> array of stereo floats, least recently used first
+        self.size = 0
+        self.pending = []               # Notes to render, the next one last
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='play_sounds note cache', daemon=True)
+        self.thread.start()
+
+    def prefetch(self, midi_notes):
+        """Render midi_notes in the background, in this order, instead of what was asked for before."""
+        with self.condition:
+            self.pending = [ note for note in reversed(midi_notes) if note not in self.buffers ]
+            self.condition.notify()
+
+    def get(self, note):
+        """The samples for note, or None if not rendered yet, in which case it is rendered next."""
+        with self.condition:
+            samples = self.buffers.get(note)
+            if samples is None:
+                self.pending.append(note)
+                self.condition.notify()
+            else:
+                self.buffers.move_to_end(note)
+            return samples
+
+    def add(self, note, samples):
+        with self.condition:
+            if note in self.buffers:
+                return
+            self.buffers[note] = samples
+            self.size = self.size + samples.itemsize * len(samples)
+            while self.size > self.max_bytes and len(self.buffers) > 1:
+                dropped, old = self.buffers.popitem(last=False)
+                self.size = self.size - old.itemsize * len(old)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                note = self.pending.pop()
+                if note in self.buffers:
+                    continue
+            self.add(note, trim_silence(render_note(note, self.samplerate, RING)))
+
+# The synth is set up by init_audio(), either on first use or in the background after startup.
+synth = None
+sfid = None
+scheduler = None
+voice_manager = None
+note_cache = None
+audio_ready = threading.Event()
+audio_error = None
+audio_lock = threading.Lock()
+init_thread = None
+pending_notes = []      # (midi note, when asked for) struck before sound was ready; the last is played once it is
+pending_lock = threading.Lock()
+
+def init_audio():
+    """Create the synth, load the SoundFont and start playback, unless already done.
+    Returns True if sound is ready. Waits if another thread is busy setting it up."""
+    global synth, sfid, scheduler, voice_manager, audio_error
+    with audio_lock:
+        if audio_ready.is_set() or audio_error is not None:
+            return audio_ready.is_set()
+        try:
+            synth = MixingSynth(samplerate=SAMPLERATE)
+            sfid = load_soundfont(synth)
+            synth.program_select(0, sfid, 0, 0)
+            synth.start()
+            scheduler = Scheduler(synth)
+            voice_manager = VoiceManager(synth, scheduler)
+        except Exception as e:
+            audio_error = e
+            print(f"Could not start sound: {e}")
+            with pending_lock:
+                pending_notes.clear()
+            return False
+        with pending_lock:
+            audio_ready.set()
+            notes = list(pending_notes)
+            pending_notes.clear()
+        # Only the last click still matters, and only if its note would still be ringing. It counts as asked
+        # for now, so the startup time doesn't show up as latency.
+        now = time.perf_counter()
+        if notes and now - notes[-1][1] < RING:
+            strike_note(notes[-1][0], now)
+        return True
+
+def init_audio_in_background():
+    """Run init_audio() on a background thread, e.g. once the main window is shown. Only starts one."""
+    global init_thread
+    if init_thread is None:
+        init_thread = threading.Thread(target=init_audio, name='play_sounds init', daemon=True)
+        init_thread.start()
+
+def is_ready():
+    """True when the synth is loaded and started, and notes will sound right away."""
+    return audio_ready.is_set()
 
 def play_arpeggio(notes):
-    midi_notes = [ n.midi_note() for n in notes ]
-    for n in midi_notes:
-        synth.noteon(0, n, 100)
-        time.sleep(0.3)
-        synth.noteoff(0, n)
+    received = time.perf_counter()
+    if not init_audio():
+        return
+    scheduler.play(arpeggio_events(midi_notes_of(notes)), received=received)
 
 def play_chord(notes):
-    midi_notes = [ n.midi_note() for n in notes ]
-    for n in midi_notes:
-        synth.noteon(0, n, 100)
-    time.sleep(0.5)
-    for n in midi_notes:
-        synth.noteoff(0, n)
+    received = time.perf_counter()
+    if not init_audio():
+        return
+    scheduler.play(chord_events(midi_notes_of(notes)), received=received)
+
+def play_sequence(events):
+    """Play [(seconds from now, NOTE_ON or NOTE_OFF, midi note), ...], stopping whatever was playing."""
+    received = time.perf_counter()
+    if not init_audio():
+        return
+    scheduler.play(events, received=received)
 
 def play_note(note):
-    synth.noteon(0, note, 100)
-    time.sleep(0.5)
-    synth.noteoff(0, note)
+    """Strike note and let it ring over whatever is playing, from the note cache if it's there.
+    Never waits: if sound isn't ready yet, the note is queued, and the last one queued is struck as soon as
+    the synth has been set up in the background, if it was asked for less than RING seconds before."""
+    received = time.perf_counter()
+    with pending_lock:
+        if not audio_ready.is_set():
+            if audio_error is None:
+                pending_notes.append((note, received))
+                init_audio_in_background()
+            return
+    strike_note(note, received)
+
+def strike_note(note, received):
+    samples = note_cache.get(note) if note_cache is not None else None
+    voice_manager.strike(note, samples, received)
+
+def timing_stats():
+    """p50, p95 and p99 in milliseconds of the latency from a play call to its first note, of how late notes
+    went to the synth, and of the jitter between the onsets of an arpeggio. See Timing.stats()."""
+    return timing.stats()
+
+def start_note_cache(max_bytes=NOTE_CACHE_BYTES):
+    """Turn on the note cache, which play_note() then plays from. Fill it with prefetch_notes()."""
+    global note_cache
+    if note_cache is None:
+        note_cache = NoteCache(SAMPLERATE, max_bytes)
+    return note_cache
+
+def prefetch_notes(midi_notes):
+    """Have the note cache render these notes in the background, if it's on."""
+    if note_cache is not None:
+        note_cache.prefetch(midi_notes)
+
+# Offline rendering: the synth runs as fast as it can into a buffer instead of to the audio device.
+offline_synths = {}
+
+def offline_synth(samplerate=SAMPLERATE):
+    """A synth with the SoundFont loaded that is never started, for rendering. One per sample rate, kept for reuse."""
+    if samplerate not in offline_synths:
+        offline = tinysoundfont.Synth(samplerate=samplerate)
+        offline.program_select(0, load_soundfont(offline), 0, 0)
+        offline_synths[samplerate] = offline
+    return offline_synths[samplerate]
+
+def render_events(events, samplerate=SAMPLERATE, tail=TAIL):
+    """Render [(seconds, NOTE_ON or NOTE_OFF, midi note), ...] to stereo float32 samples, returned as a memoryview.
+    Events land on the exact sample, and the whole buffer is allocated once and filled in place."""
+    synth = offline_synth(samplerate)
+    synth.sounds_off(0)
+    events = in_time_order(events)
+    frames = int(((events[-1][0] if events else 0) + tail) * samplerate)
+    buffer = memoryview(bytearray(frames * FRAME_BYTES))
+    position = 0
+    for offset, kind, note in events:
+        frame = min(int(round(offset * samplerate)), frames)
+        if frame > position:
+            synth.generate_simple(frame - position, buffer=buffer[position*FRAME_BYTES:frame*FRAME_BYTES])
+            position = frame
+        if kind == NOTE_ON:
+            synth.noteon(0, note, VELOCITY)
+        else:
+            synth.noteoff(0, note)
+    if frames > position:
+        synth.generate_simple(frames - position, buffer=buffer[position*FRAME_BYTES:])
+    return buffer
+
+def trim_silence(samples, threshold=0.001):
+    """Rendered samples as an array of floats, without the tail once it's quieter than threshold (-60 dB)."""
+    trimmed = array('f')
+    trimmed.frombytes(samples)
+    block = 512 * CHANNELS
+    end = len(trimmed)
+    while end > 0:
+        tail = trimmed[max(end - block, 0):end]
+        if max(tail) > threshold or -min(tail) > threshold:
+            break
+        end = max(end - block, 0)
+    del trimmed[end:]
+    return trimmed
+
+def render_arpeggio(notes, samplerate=SAMPLERATE):
+    return render_events(arpeggio_events(midi_notes_of(notes)), samplerate)
+
+def render_chord(notes, samplerate=SAMPLERATE):
+    return render_events(chord_events(midi_notes_of(notes)), samplerate)
+
+def render_note(note, samplerate=SAMPLERATE, duration=0.5):
+    return render_events(chord_events([note], duration), samplerate)
+
+def save_wav(filename, samples, samplerate=SAMPLERATE):
+    """Write rendered samples as a 32-bit float stereo WAV file, as they are, without converting them."""
+    size = len(samples)
+    header = struct.pack('<4sI4s' '4sIHHIIHHH' '4sII' '4sI',
+                         b'RIFF', 4 + 26 + 12 + 8 + size, b'WAVE',
+                         b'fmt ', 18, 3, CHANNELS, samplerate, samplerate * FRAME_BYTES, FRAME_BYTES, 32, 0,
+                         b'fact', 4, size // FRAME_BYTES,
+                         b'data', size)
+    with open(filename, 'wb') as f:
+        f.write(header)
+        f.write(samples)
 
 if __name__ == '__main__':
     chord = Chord(Note('C#'), 'min')
@@ -46,7 +515,10 @@ if __name__ == '__main__':
     scale_notes = [(note + i) for i in scale.intervals]
 
     play_chord(chord.notes)
-    time.sleep(1)
+    scheduler.wait()
+    time.sleep(0.5)
     play_arpeggio(chord.notes)
-    time.sleep(1)
-    play_arpeggio(scale_notes)
\ No newline at end of file
+    scheduler.wait()
+    time.sleep(0.5)
+    play_arpeggio(scale_notes)
+    scheduler.wait()
\ No newline at end of file
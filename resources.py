@@ -0,0 +1,28 @@
+import os
+import importlib
+from PyQt5.QtCore import QResource
+
+__location__ = os.path.dirname(os.path.abspath(__file__))
+
+# The pyrcc5 generated modules, and the binary bundles built from them by make_rcc.py.
+BUNDLES = {
+    'fretboard_rc':             'fretboard_rc.rcc',
+    'play_sounds_resources':    'play_sounds_resources.rcc',
+}
+
+registered = {}
+
+def register_resources(module_name, use_rcc=True):
+    """Register the Qt resources of module_name, once.
+    Prefers the binary .rcc bundle, which Qt memory-maps, over importing the generated Python module.
+    Returns 'rcc' or 'module', whichever was used."""
+    if module_name in registered:
+        return registered[module_name]
+
+    rccfile = os.path.join(__location__, BUNDLES[module_name])
+    if use_rcc and os.path.isfile(rccfile) and QResource.registerResource(rccfile):
+        registered[module_name] = 'rcc'
+    else:
+        importlib.import_module(module_name)
+        registered[module_name] = 'module'
+    return registered[module_name]
@@ -0,0 +1,50 @@
+import time
+import json
+
+class StartupProfiler():
+    """Records the wall-clock time of each startup phase, as the time since the previous mark."""
+    def __init__(self):
+        self.phases = []
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        """End the current phase and call it phase."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def total(self):
+        return sum(seconds for phase, seconds in self.phases)
+
+    def results(self):
+        """Phase -> milliseconds, in order, with the total last."""
+        results = { phase: round(seconds*1000, 2) for phase, seconds in self.phases }
+        results['total'] = round(self.total()*1000, 2)
+        return results
+
+    def table(self):
+        """The phases as a plain text table."""
+        total = self.total() or 1
+        lines = [f"{'Phase':<28}{'ms':>10}{'%':>8}"]
+        for phase, seconds in self.phases:
+            lines.append(f"{phase:<28}{seconds*1000:>10.1f}{100*seconds/total:>8.1f}")
+        lines.append(f"{'total':<28}{self.total()*1000:>10.1f}{100.0:>8.1f}")
+        return "\n".join(lines)
+
+    def write_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.results(), f, indent=4)
+
+    def check_budget(self, filename):
+        """Compare with a budget file, {"phase": max milliseconds, ...}, "total" included.
+        Returns a list of messages for the phases over budget."""
+        with open(filename, 'r') as f:
+            budget = json.load(f)
+        results = self.results()
+        over = []
+        for phase, limit in budget.items():
+            if phase in results and results[phase] > limit:
+                over.append(f"{phase}: {results[phase]:.1f} ms, budget {limit} ms")
+        return over
+
+profiler = StartupProfiler()
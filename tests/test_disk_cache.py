@@ -0,0 +1,53 @@
+from disk_cache import DiskCache, fingerprint, source_hash, function_source
+
+def test_round_trip(tmp_path):
+    filename = str(tmp_path / 'cache.bin')
+    cache = DiskCache(filename).load()
+    assert cache.get('widths', (24, 'E2'), lambda: [1.0, 0.5]) == [1.0, 0.5]
+    cache.save()
+    assert DiskCache(filename).load().lookup('widths', (24, 'E2')) == [1.0, 0.5]
+
+def test_changed_inputs_miss(tmp_path):
+    filename = str(tmp_path / 'cache.bin')
+    cache = DiskCache(filename).load()
+    cache.store('widths', (24, 'E2'), [1.0])
+    cache.save()
+    cache = DiskCache(filename).load()
+    assert cache.lookup('widths', (22, 'E2')) is None
+    assert cache.lookup('other', (24, 'E2')) is None
+    calls = []
+    assert cache.get('widths', (22, 'E2'), lambda: calls.append(1) or [2.0]) == [2.0]
+    assert calls == [1]
+
+def test_fingerprint():
+    assert fingerprint((1, 'a')) == fingerprint((1, 'a'))
+    assert fingerprint((1, 'a')) != fingerprint((1, 'b'))
+
+def test_bad_files_give_an_empty_cache(tmp_path):
+    missing = DiskCache(str(tmp_path / 'missing.bin')).load()
+    assert missing.entries == {}
+    corrupt = tmp_path / 'corrupt.bin'
+    corrupt.write_bytes(b'not a cache')
+    assert DiskCache(str(corrupt)).load().entries == {}
+
+def test_save_only_when_changed(tmp_path):
+    filename = tmp_path / 'cache.bin'
+    DiskCache(str(filename)).load().save()
+    assert not filename.exists()
+
+def widths(frets=3):
+    """A module level function to read the source of."""
+    return [1] * frets
+
+def test_function_source():
+    assert function_source(widths) == ('def widths(frets=3):\n'
+                                       '    """A module level function to read the source of."""\n'
+                                       '    return [1] * frets')
+
+def test_source_hash_changes_with_the_file(tmp_path):
+    source = tmp_path / 'module.py'
+    source.write_text("X = 1\n")
+    before = source_hash(str(source))
+    assert source_hash(str(source)) == before
+    source.write_text("X = 2\n")
+    assert source_hash(str(source)) != before
@@ -0,0 +1,34 @@
+import pytest
+from fingering import fingering, tab
+
+GUITAR = ['E2', 'A2', 'D3', 'G3', 'B3', 'E4']
+
+def test_fingering_plays_every_note():
+    notes = [48, 50, 52, 53, 55, 57, 59, 60]
+    open_midi = [64, 59, 55, 50, 45, 40]    # Top-down, as the rows
+    path = fingering(notes, GUITAR)
+    assert len(path) == len(notes)
+    assert [ open_midi[row] + fret for row, fret in path ] == notes
+
+def test_fingering_stays_in_frets():
+    path = fingering([60, 62, 64], GUITAR, frets=(5, 12))
+    assert all(5 <= fret <= 12 for row, fret in path)
+
+def test_unplayable_note():
+    with pytest.raises(ValueError):
+        fingering([30], GUITAR)
+
+def test_tab():
+    path = fingering([48, 50, 52, 53, 55], GUITAR)
+    assert tab(path, GUITAR) == ("E|-----------|\n"
+                                 "B|-----------|\n"
+                                 "G|-----------|\n"
+                                 "D|---0-2-3-5-|\n"
+                                 "A|-3---------|\n"
+                                 "E|-----------|\n")
+
+def test_tab_wraps():
+    path = [(4, 3), (3, 0), (3, 2), (3, 3), (3, 5)]
+    systems = tab(path, GUITAR, width=12).split("\n\n")
+    assert len(systems) == 2
+    assert systems[1].splitlines()[3] == "D|-5-|"
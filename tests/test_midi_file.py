@@ -0,0 +1,64 @@
+import io
+import struct
+import pytest
+from midi_file import MidiFileWriter, write_midi, variable_length, arpeggio_events, chord_events, NOTE_ON
+
+def chunks(data):
+    """(chunk type, chunk data) pairs of a Standard MIDI File."""
+    found = []
+    offset = 0
+    while offset < len(data):
+        kind, length = struct.unpack('>4sI', data[offset:offset+8])
+        found.append((kind, data[offset+8:offset+8+length]))
+        offset = offset + 8 + length
+    return found
+
+def test_variable_length():
+    assert variable_length(0) == b'\x00'
+    assert variable_length(0x7f) == b'\x7f'
+    assert variable_length(0x80) == b'\x81\x00'
+    assert variable_length(0x0fffffff) == b'\xff\xff\xff\x7f'
+
+def test_type_0_file(tmp_path):
+    filename = str(tmp_path / 'chord.mid')
+    write_midi(filename, [('C major', chord_events([60, 64, 67]))], type=0)
+    with open(filename, 'rb') as f:
+        data = f.read()
+    found = chunks(data)
+    assert [ kind for kind, chunk in found ] == [b'MThd', b'MTrk']
+    assert struct.unpack('>HHH', found[0][1]) == (0, 1, 480)
+    # The track length covers everything after it, up to the end of track event.
+    assert len(data) == 14 + 8 + len(found[1][1])
+    assert found[1][1].endswith(b'\xff\x2f\x00')
+
+def test_type_1_file_from_a_generator(tmp_path):
+    filename = str(tmp_path / 'keys.mid')
+    tracks = ( (f"track {n}", arpeggio_events([60 + n, 64 + n])) for n in range(3) )
+    write_midi(filename, tracks, type=1)
+    with open(filename, 'rb') as f:
+        found = chunks(f.read())
+    assert struct.unpack('>HHH', found[0][1]) == (1, 3, 480)
+    assert [ kind for kind, chunk in found[1:] ] == [b'MTrk'] * 3
+
+def test_note_timing():
+    f = io.BytesIO()
+    writer = MidiFileWriter(f)
+    writer.start_track()
+    writer.events([(0, NOTE_ON, 60), (0.5, 'off', 60)])
+    writer.close()
+    track = chunks(f.getvalue())[1][1]
+    # Tempo, then the note on and, a beat (480 ticks) later at 120 bpm, the note off.
+    assert track[7:] == b'\x00\x90\x3c\x64' + variable_length(480) + b'\x80\x3c\x00' + b'\x00\xff\x2f\x00'
+
+def test_events_out_of_order():
+    writer = MidiFileWriter(io.BytesIO())
+    writer.start_track()
+    writer.event(1, NOTE_ON, 60)
+    with pytest.raises(ValueError):
+        writer.event(0.5, NOTE_ON, 64)
+
+def test_type_0_has_one_track():
+    writer = MidiFileWriter(io.BytesIO(), type=0)
+    writer.start_track()
+    with pytest.raises(ValueError):
+        writer.start_track()
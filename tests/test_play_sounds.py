@@ -0,0 +1,160 @@
+import time
+import threading
+from array import array
+import pytest
+
+pytest.importorskip('tinysoundfont')
+import play_sounds
+from play_sounds import Scheduler, VoiceManager, MixingSynth, trim_silence, FADE_OUT, FADE_FRAMES, CHANNELS
+from midi_file import NOTE_ON, NOTE_OFF
+
+class StubSynth():
+    """Records what would have been played."""
+    def __init__(self):
+        self.played = []
+
+    def noteon(self, channel, note, velocity):
+        self.played.append(('on', note))
+
+    def noteoff(self, channel, note):
+        self.played.append(('off', note))
+
+    def mix(self, samples, received=None):
+        voice = ['voice', samples]
+        self.played.append(('mix', samples))
+        return voice
+
+    def fade(self, voice):
+        self.played.append(('fade', voice[1]))
+
+class StubScheduler():
+    """Keeps call_later() calls to run by hand."""
+    def __init__(self):
+        self.calls = []
+
+    def call_later(self, seconds, function, *args):
+        self.calls.append((seconds, function, args))
+
+    def run_calls(self):
+        calls, self.calls = self.calls, []
+        for seconds, function, args in calls:
+            function(*args)
+
+def test_wait_returns_after_a_call():
+    scheduler = Scheduler(StubSynth())
+    called = threading.Event()
+    scheduler.call_later(0.05, called.set)
+    start = time.perf_counter()
+    assert scheduler.wait(2)
+    assert called.wait(2)
+    assert time.perf_counter() - start < 1
+
+def test_wait_skips_calls_but_not_notes():
+    synth = StubSynth()
+    scheduler = Scheduler(synth)
+    scheduler.call_later(10, lambda: None)
+    scheduler.play([(0, NOTE_ON, 60), (0.05, NOTE_OFF, 60)])
+    start = time.perf_counter()
+    assert scheduler.wait(2)
+    assert time.perf_counter() - start < 2
+    assert synth.played == [('on', 60), ('off', 60)]
+    assert not scheduler.busy()
+
+def test_cancel_keeps_calls():
+    synth = StubSynth()
+    scheduler = Scheduler(synth)
+    called = threading.Event()
+    scheduler.play([(0.2, NOTE_ON, 60)])
+    scheduler.call_later(0.1, called.set)
+    scheduler.cancel()
+    assert called.wait(2)
+    assert synth.played == []
+
+def test_release_after_ring():
+    synth, scheduler = StubSynth(), StubScheduler()
+    voices = VoiceManager(synth, scheduler, polyphony=2, ring=0.5)
+    voices.strike(60)
+    assert [ seconds for seconds, function, args in scheduler.calls ] == [0.5]
+    assert voices.sounding() == 1
+    scheduler.run_calls()
+    assert synth.played == [('on', 60), ('off', 60)]
+    assert voices.sounding() == 0
+
+def test_steal_the_oldest_voice():
+    synth, scheduler = StubSynth(), StubScheduler()
+    voices = VoiceManager(synth, scheduler, polyphony=2)
+    for note in (60, 62, 64):
+        voices.strike(note)
+    assert synth.played == [('on', 60), ('on', 62), ('off', 60), ('on', 64)]
+    assert voices.sounding() == 2
+    # The stolen voice's release comes later and is ignored.
+    scheduler.run_calls()
+    assert synth.played[4:] == [('off', 62), ('off', 64)]
+
+def test_stolen_mixed_voice_fades():
+    synth, scheduler = StubSynth(), StubScheduler()
+    voices = VoiceManager(synth, scheduler, polyphony=1)
+    first, second = array('f', [0.5]), array('f', [0.25])
+    voices.strike(60, first)
+    voices.strike(62, second)
+    assert synth.played == [('mix', first), ('fade', first), ('mix', second)]
+    # A mixed voice let go after ring seconds ends by itself.
+    scheduler.run_calls()
+    assert synth.played[3:] == []
+
+def test_fade_ends_after_fade_frames():
+    synth = MixingSynth(samplerate=play_sounds.SAMPLERATE)
+    voice = synth.mix(array('f', [1.0] * (FADE_FRAMES * CHANNELS * 4)))
+    synth.generate(10)
+    synth.fade(voice)
+    assert voice[4] == 10 * CHANNELS
+    assert voice[3] == voice[4] + len(FADE_OUT)
+    out = array('f')
+    out.frombytes(synth.generate(FADE_FRAMES * 2))
+    # The fade starts at full volume and is over after FADE_FRAMES.
+    assert out[0] == pytest.approx(1.0, abs=0.01)
+    assert out[(FADE_FRAMES - 1) * CHANNELS] < 0.02
+    assert synth.voices == []
+
+def test_trim_silence():
+    loud, quiet = [0.5] * 1024, [0.0005] * 4096
+    trimmed = trim_silence(array('f', loud + quiet).tobytes())
+    assert 1024 <= len(trimmed) < 1024 + 1024
+    assert len(trim_silence(array('f', quiet).tobytes())) == 0
+    assert len(trim_silence(array('f', loud).tobytes())) == 1024
+
+@pytest.fixture
+def starting_audio(monkeypatch):
+    """play_sounds as before the synth is set up, with a stub synth and strike_note() recorded."""
+    struck = []
+    class Synth(StubSynth):
+        def __init__(self, samplerate):
+            super().__init__()
+        def program_select(self, *args):
+            pass
+        def start(self):
+            pass
+    monkeypatch.setattr(play_sounds, 'MixingSynth', Synth)
+    monkeypatch.setattr(play_sounds, 'load_soundfont', lambda synth: 0)
+    for name in ('synth', 'sfid', 'scheduler', 'voice_manager'):
+        monkeypatch.setattr(play_sounds, name, None)
+    monkeypatch.setattr(play_sounds, 'audio_ready', threading.Event())
+    monkeypatch.setattr(play_sounds, 'audio_error', None)
+    monkeypatch.setattr(play_sounds, 'pending_notes', [])
+    monkeypatch.setattr(play_sounds, 'init_audio_in_background', lambda: None)
+    monkeypatch.setattr(play_sounds, 'strike_note', lambda note, received: struck.append((note, received)))
+    return struck
+
+def test_only_the_last_queued_note_is_struck(starting_audio):
+    for note in (60, 62, 64):
+        play_sounds.play_note(note)
+    assert starting_audio == []
+    before = time.perf_counter()
+    assert play_sounds.init_audio()
+    assert [ note for note, received in starting_audio ] == [64]
+    assert starting_audio[0][1] >= before
+
+def test_old_queued_notes_are_dropped(starting_audio):
+    play_sounds.pending_notes.append((60, time.perf_counter() - 2 * play_sounds.RING))
+    assert play_sounds.init_audio()
+    assert starting_audio == []
@@ -0,0 +1,45 @@
+from itertools import islice
+from fretboard import Fretboard, harmony_table
+
+def fingers_needed(frets):
+    """Fretted notes, those on the lowest fret counting as one barre unless an open string sounds between them."""
+    fretted = [ (s, f) for s, f in enumerate(frets) if f ]
+    if not fretted:
+        return 0
+    low = min(f for s, f in fretted)
+    barre = [ s for s, f in fretted if f == low ]
+    split = any(frets[s] == 0 for s in range(barre[0], barre[-1]+1))
+    return len(fretted) - len(barre) + (len(barre) if split else 1)
+
+def test_open_c_major_comes_first():
+    voicings = list(islice(Fretboard().voicings(harmony_table.chord('C', 'maj')), 3))
+    assert voicings[0].frets == (0, 1, 0, 2, 3, None)
+    assert voicings[0].midi == (48, 52, 55, 60, 64)
+
+def test_voicings_respect_fingers_and_span():
+    f = Fretboard()
+    for name in ('maj', 'min', 'dom7', 'min7', 'sus4'):
+        for fingers in (2, 3, 4):
+            for voicing in f.voicings(harmony_table.chord('A', name), span=4, fingers=fingers):
+                fretted = [ fret for fret in voicing.frets if fret ]
+                assert fingers_needed(voicing.frets) <= fingers
+                assert not fretted or max(fretted) - min(fretted) < 4
+
+def test_barre_split_by_open_string_needs_its_fingers():
+    f = Fretboard()
+    shape = (0, 1, 0, 2, 1, None)
+    assert shape not in [ v.frets for v in f.voicings(harmony_table.chord('C', 'dom7'), fingers=2) ]
+    assert shape in [ v.frets for v in f.voicings(harmony_table.chord('C', 'dom7'), fingers=3) ]
+
+def test_identify():
+    match = harmony_table.identify([48, 52, 55])[0]
+    assert (match.root, match.name, match.inversion) == ('C', 'maj', 0)
+    match = harmony_table.identify([52, 55, 60])[0]
+    assert (match.root, match.name, match.bass) == ('C', 'maj', 'E')
+    assert match.inversion == 1
+    assert harmony_table.identify([]) == []
+
+def test_identify_positions():
+    # Strings counted from 1 at the top: C major open shape.
+    positions = [(2, 1), (3, 0), (4, 2), (5, 3)]
+    assert Fretboard().identify(positions)[0].root == 'C'